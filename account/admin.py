@@ -2,8 +2,13 @@ from django.contrib import admin
 
 # Register your models here.
 from account.models import UserProfile
+from project_hermes.paginator import ApproximateCountPaginator
 
 
 @admin.register(UserProfile)
 class UserProfileAdmin(admin.ModelAdmin):
     list_display = ['id', 'user', 'reputation']
+    list_select_related = ['user']
+    raw_id_fields = ['user']
+    paginator = ApproximateCountPaginator
+    show_full_result_count = False
@@ -0,0 +1,66 @@
+"""
+Ranks on the leaderboards without counting every profile above.
+
+Reputations are grouped in buckets growing geometrically with the reputation. The number of profiles per bucket is
+cached for Configurations.LEADERBOARD_RANK_CACHE_TIMEOUT seconds, a rank adds up the cached buckets above the profile
+and counts the profiles above it inside its own bucket, a short range scan on the reputation index. The rank is exact
+but for the profiles moving between buckets since the histogram was cached.
+"""
+
+import math
+
+from django.core.cache import cache
+from django.db.models import Count
+
+from account.models import UserProfile, LeaderboardEntry
+from project_hermes.hermes_config import Configurations
+from project_hermes.metrics import record_cache
+
+
+def get_bucket_bound(bucket):
+    """
+    Lowest reputation of the bucket
+    """
+
+    exponent = abs(bucket) / Configurations.LEADERBOARD_RANK_BUCKETS_PER_OCTAVE
+    return math.copysign(2 ** exponent - 1, bucket)
+
+
+def get_bucket(reputation):
+    steps = Configurations.LEADERBOARD_RANK_BUCKETS_PER_OCTAVE
+    bucket = math.floor(math.copysign(math.log2(1 + abs(reputation)), reputation) * steps)
+    # Rounding may put a reputation lying on a bound in the neighbouring bucket, the bounds are authoritative
+    while reputation < get_bucket_bound(bucket):
+        bucket -= 1
+    while reputation >= get_bucket_bound(bucket + 1):
+        bucket += 1
+    return bucket
+
+
+def get_queryset(region):
+    return UserProfile.objects.all() if region is None else LeaderboardEntry.objects.filter(region=region)
+
+
+def get_histogram(region):
+    """
+    Number of profiles per reputation bucket of the leaderboard, built from one GROUP BY on the reputation
+    """
+
+    key = 'leaderboard_histogram:%s' % (region or 'global')
+    histogram = cache.get(key)
+    record_cache('leaderboard_histogram', histogram is not None)
+    if histogram is None:
+        histogram = {}
+        for reputation, count in get_queryset(region).values_list('reputation').annotate(Count('id')).order_by():
+            bucket = get_bucket(reputation)
+            histogram[bucket] = histogram.get(bucket, 0) + count
+        cache.set(key, histogram, Configurations.LEADERBOARD_RANK_CACHE_TIMEOUT)
+    return histogram
+
+
+def get_rank(region, reputation):
+    bucket = get_bucket(reputation)
+    above = sum(count for other, count in get_histogram(region).items() if other > bucket)
+    above += get_queryset(region).filter(reputation__gt=reputation,
+                                         reputation__lt=get_bucket_bound(bucket + 1)).count()
+    return above + 1
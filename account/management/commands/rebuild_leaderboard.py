@@ -0,0 +1,27 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from account.models import LeaderboardEntry, UserProfile
+from item.models import Item
+
+
+class Command(BaseCommand):
+    help = 'Rebuilds the regional leaderboards from the items and the current reputations'
+
+    def handle(self, *args, **options):
+        standings = set()
+        for author_id, latitude, longitude in Item.objects.values_list('author', 'latitude', 'longitude').iterator():
+            standings.add((LeaderboardEntry.get_region(latitude, longitude), author_id))
+
+        reputations = dict(UserProfile.objects.filter(pk__in={author_id for _, author_id in standings})
+                           .values_list('id', 'reputation'))
+
+        with transaction.atomic():
+            LeaderboardEntry.objects.all().delete()
+            LeaderboardEntry.objects.bulk_create(
+                    [LeaderboardEntry(region=region, profile_id=author_id, reputation=reputations[author_id])
+                     for region, author_id in standings],
+                    batch_size=1000
+            )
+
+        self.stdout.write('Rebuilt %d leaderboard entries' % len(standings))
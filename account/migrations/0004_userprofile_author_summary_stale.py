@@ -0,0 +1,25 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+
+
+def mark_all_stale(apps, schema_editor):
+    # The content rows get their first author summary from the next propagate_author_summaries run
+    apps.get_model('account', 'UserProfile').objects.update(author_summary_stale=True)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('account', '0003_leaderboard'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='userprofile',
+            name='author_summary_stale',
+            field=models.BooleanField(db_index=True, default=False),
+        ),
+        migrations.RunPython(mark_all_stale, migrations.RunPython.noop),
+    ]
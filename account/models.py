@@ -1,19 +1,54 @@
 from __future__ import unicode_literals
 
+import bisect
+import math
 import uuid
 
 from django.contrib.auth.models import User
 from django.db import models
 from django.utils import timezone
 
+from project_hermes.hermes_config import Configurations
+
 
 class UserProfile(models.Model):
     user = models.ForeignKey(User)
-    reputation = models.FloatField(default=0)
+    reputation = models.FloatField(default=0, db_index=True)
+    # The display name or the tier changed since the author summary of the content was last written
+    author_summary_stale = models.BooleanField(default=False, db_index=True)
 
     def __str__(self):
         return self.user.first_name + '[' + self.user.email + ']'
 
+    def get_display_name(self):
+        return (self.user.get_full_name() or self.user.username)[:150]
+
+    @staticmethod
+    def get_tier(reputation):
+        return bisect.bisect_right(Configurations.REPUTATION_TIERS, reputation)
+
+
+class LeaderboardEntry(models.Model):
+    """
+    Materialized standing of a user in a region, one row per region the user has contributed items to.
+    The reputation is a copy of UserProfile.reputation kept in sync whenever the reputation is recalculated,
+    so the top of a region is a range scan on (region, reputation), and so is the part of a rank not read from the
+    histogram of account.leaderboard.
+    """
+
+    region = models.CharField(max_length=32)
+    profile = models.ForeignKey(UserProfile, related_name='leaderboard_entries')
+    reputation = models.FloatField(default=0)
+
+    class Meta:
+        unique_together = [['region', 'profile']]
+        index_together = [['region', 'reputation']]
+
+    @staticmethod
+    def get_region(latitude, longitude):
+        size = Configurations.LEADERBOARD_REGION_SIZE
+        return '%d:%d' % (math.floor(latitude / size), math.floor(longitude / size))
+
 
 class UserToken(models.Model):
     user = models.ForeignKey(User)
@@ -0,0 +1,13 @@
+from django.contrib.auth.models import User
+from django.db.models.signals import post_save
+from django.dispatch import receiver
+
+from account.models import UserProfile
+
+
+@receiver(post_save, sender=User)
+def mark_author_summary_stale(sender, instance, created, update_fields=None, **kwargs):
+    # Logins only save last_login, they do not change the display name
+    if created or (update_fields and set(update_fields) <= {'last_login'}):
+        return
+    UserProfile.objects.filter(user=instance, author_summary_stale=False).update(author_summary_stale=True)
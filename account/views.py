@@ -1 +1,82 @@
-# Create your views here.
+import math
+
+from rest_framework import viewsets
+from rest_framework.decorators import list_route
+from rest_framework.response import Response
+from rest_framework.status import HTTP_400_BAD_REQUEST
+
+from account.leaderboard import get_rank
+from account.models import UserProfile, LeaderboardEntry
+from account.serializers import UserProfileSerializer
+from project_hermes.hermes_config import Configurations
+
+
+class LeaderboardViewSet(viewsets.ViewSet):
+    """
+    Top contributors, globally or in the region around `latitude` and `longitude`
+    """
+
+    permission_classes = []
+
+    @staticmethod
+    def get_region(request):
+        if 'latitude' not in request.query_params and 'longitude' not in request.query_params:
+            return None
+        latitude = float(request.query_params['latitude'])
+        longitude = float(request.query_params['longitude'])
+        if not math.isfinite(latitude) or not math.isfinite(longitude):
+            raise ValueError('Coordinates must be finite')
+        return LeaderboardEntry.get_region(latitude, longitude)
+
+    def list(self, request):
+        try:
+            region = self.get_region(request)
+            limit = max(1, min(int(request.query_params.get('limit', Configurations.LEADERBOARD_SIZE)),
+                               Configurations.LEADERBOARD_SIZE))
+        except (KeyError, ValueError):
+            return Response({'success': False, 'message': 'Incorrect Data Sent'}, status=HTTP_400_BAD_REQUEST)
+
+        if region is None:
+            profiles = UserProfile.objects.select_related('user').order_by('-reputation', 'id')[:limit]
+        else:
+            entries = LeaderboardEntry.objects.filter(region=region).select_related('profile__user') \
+                          .order_by('-reputation', 'profile')[:limit]
+            profiles = [entry.profile for entry in entries]
+
+        response = {
+            'region': region,
+            'results': UserProfileSerializer(profiles, many=True).data
+        }
+        return Response(response)
+
+    @list_route()
+    def rank(self, request):
+        """
+        Rank of the profile `profile` (or of the current user), from the cached reputation histogram of the
+        leaderboard and the profiles above it in its reputation bucket
+        """
+
+        try:
+            region = self.get_region(request)
+            if 'profile' in request.query_params:
+                profile = UserProfile.objects.filter(pk=int(request.query_params['profile'])).first()
+            elif request.user.is_authenticated():
+                profile = UserProfile.objects.filter(user=request.user).first()
+            else:
+                profile = None
+        except (KeyError, ValueError):
+            return Response({'success': False, 'message': 'Incorrect Data Sent'}, status=HTTP_400_BAD_REQUEST)
+
+        if not profile:
+            return Response({'success': False, 'message': 'Unknown User'}, status=HTTP_400_BAD_REQUEST)
+
+        if region is not None and not LeaderboardEntry.objects.filter(region=region, profile=profile).exists():
+            return Response({'success': False, 'message': 'Not Ranked In Region'})
+
+        response = {
+            'success': True,
+            'region': region,
+            'rank': get_rank(region, profile.reputation),
+            'reputation': profile.reputation,
+        }
+        return Response(response)
@@ -0,0 +1,54 @@
+"""
+Fan-out on write of the activity feeds.
+
+Every write endpoint records one entry per interested profile: the contributor, and the author of the content the
+contribution is about. Reading a feed is then a single range scan instead of a union over the content tables.
+Feeds are trimmed to Configurations.ACTIVITY_FEED_RETENTION entries, once every ACTIVITY_FEED_TRIM_INTERVAL writes
+on average, so a feed briefly holds a few more entries than the retention.
+"""
+
+import random
+
+from item.models import ActivityEntry
+from project_hermes.hermes_config import Configurations
+
+
+def trim_feed(owner_id):
+    """
+    Deletes the entries older than the newest ACTIVITY_FEED_RETENTION ones of the feed
+    """
+
+    retention = Configurations.ACTIVITY_FEED_RETENTION
+    oldest_kept = ActivityEntry.objects.filter(owner_id=owner_id).order_by('-id') \
+        .values_list('id', flat=True)[retention - 1:retention]
+    if oldest_kept:
+        return ActivityEntry.objects.filter(owner_id=owner_id, id__lt=oldest_kept[0]).delete()[0]
+    return 0
+
+
+def record_activity(actor_id, verb, item_id, author_id, reactable_id=None, value=None):
+    """
+    Writes the activity to the feed of the actor and to the feed of `author_id`, the author of the content acted on
+    """
+
+    owner_ids = {actor_id, author_id}
+    ActivityEntry.objects.bulk_create([
+        ActivityEntry(owner_id=owner_id, actor_id=actor_id, verb=verb, item_id=item_id, reactable_id=reactable_id,
+                      value=value)
+        for owner_id in owner_ids
+    ])
+
+    for owner_id in owner_ids:
+        if random.random() * Configurations.ACTIVITY_FEED_TRIM_INTERVAL < 1:
+            trim_feed(owner_id)
+
+
+def get_feed(owner_id, before=None, limit=None):
+    """
+    Page of the feed newest first, `before` is the id of the last entry of the previous page
+    """
+
+    entries = ActivityEntry.objects.filter(owner_id=owner_id).select_related('actor__user').order_by('-id')
+    if before is not None:
+        entries = entries.filter(id__lt=before)
+    return list(entries[:limit or Configurations.ACTIVITY_FEED_PAGE_SIZE])
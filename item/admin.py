@@ -1,29 +1,79 @@
 from django.contrib import admin
 
 # Register your models here.
-from item.models import Item, Comment, Photo, Rating, Reaction
+from item.models import Item, Comment, Photo, Rating, Reaction, ItemStatusChoices
+from item.views import set_items_status, remove_reactables
+from project_hermes.paginator import ApproximateCountPaginator
+
+
+class LargeTableAdmin(admin.ModelAdmin):
+    paginator = ApproximateCountPaginator
+    show_full_result_count = False
 
 
 @admin.register(Item)
-class ItemAdmin(admin.ModelAdmin):
-    list_display = ['id', 'title', 'latitude', 'longitude', 'rating', 'author']
+class ItemAdmin(LargeTableAdmin):
+    list_display = ['id', 'title', 'latitude', 'longitude', 'rating', 'flags', 'status', 'timestamp', 'author']
+    list_filter = ['status', 'timestamp']
+    list_select_related = ['author__user']
+    raw_id_fields = ['author']
+    ordering = ['-flags', '-timestamp']
+    actions = ['verify_items', 'remove_items']
+
+    def get_queryset(self, request):
+        queryset = Item.all_objects.get_queryset().select_related('author__user')
+        ordering = self.get_ordering(request)
+        if ordering:
+            queryset = queryset.order_by(*ordering)
+        return queryset
+
+    def verify_items(self, request, queryset):
+        updated = set_items_status(list(queryset.values_list('id', flat=True)), ItemStatusChoices.VERIFIED)
+        self.message_user(request, '%d items verified' % updated)
+
+    def remove_items(self, request, queryset):
+        updated = set_items_status(list(queryset.values_list('id', flat=True)), ItemStatusChoices.REMOVED)
+        self.message_user(request, '%d items removed' % updated)
+
+
+class ReactableAdmin(LargeTableAdmin):
+    list_filter = ['timestamp']
+    list_select_related = ['author__user']
+    raw_id_fields = ['author', 'item']
+    ordering = ['-flags', '-timestamp']
+    actions = ['remove_reactables']
+
+    def get_actions(self, request):
+        actions = super().get_actions(request)
+        # The bulk removal below also fixes the reputations, the default per-object delete does not
+        actions.pop('delete_selected', None)
+        return actions
+
+    def remove_reactables(self, request, queryset):
+        removed = remove_reactables(self.model, list(queryset.values_list('id', flat=True)))
+        self.message_user(request, '%d entries removed' % removed)
 
 
 @admin.register(Comment)
-class CommentAdmin(admin.ModelAdmin):
-    list_display = ['id', 'comment', 'upvotes', 'downvotes', 'flags', 'author']
+class CommentAdmin(ReactableAdmin):
+    list_display = ['id', 'description', 'upvotes', 'downvotes', 'flags', 'timestamp', 'author']
 
 
 @admin.register(Photo)
-class PhotoAdmin(admin.ModelAdmin):
-    list_display = ['id', 'picture', 'upvotes', 'downvotes', 'flags', 'author']
+class PhotoAdmin(ReactableAdmin):
+    list_display = ['id', 'picture', 'upvotes', 'downvotes', 'flags', 'timestamp', 'author']
 
 
 @admin.register(Rating)
-class RatingAdmin(admin.ModelAdmin):
+class RatingAdmin(LargeTableAdmin):
     list_display = ['id', 'author', 'item', 'rating']
+    list_select_related = ['author__user', 'item']
+    raw_id_fields = ['author', 'item']
 
 
 @admin.register(Reaction)
-class ReactionAdmin(admin.ModelAdmin):
-    list_display = ['id', 'author', 'reactable', 'reaction']
+class ReactionAdmin(LargeTableAdmin):
+    list_display = ['id', 'author', 'reactable', 'reaction', 'timestamp']
+    list_filter = ['reaction', 'timestamp']
+    list_select_related = ['author__user', 'reactable']
+    raw_id_fields = ['author', 'reactable']
@@ -3,3 +3,6 @@ from django.apps import AppConfig
 
 class ItemConfig(AppConfig):
     name = 'item'
+
+    def ready(self):
+        import item.signals  # noqa: F401 pylint: disable=W0612
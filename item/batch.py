@@ -0,0 +1,85 @@
+"""
+Batch retrieval of items, comments and photos by id.
+
+The serialized objects are cached per object. Saves and deletes invalidate them through item.signals, and the bulk
+UPDATEs that skip the signals invalidate them explicitly. The embedded author (and their reputation) and the vote
+counters written by the batch jobs may be up to Configurations.BATCH_CACHE_TIMEOUT seconds old.
+
+The cache is shared by all the workers, so misses are always read from the primary. An object read from a lagging
+replica would be cached over the invalidation of its last write.
+"""
+
+from collections import OrderedDict
+
+from django.core.cache import cache
+from django.db import DEFAULT_DB_ALIAS
+from rest_framework.decorators import list_route
+from rest_framework.response import Response
+from rest_framework.status import HTTP_400_BAD_REQUEST
+
+from item.serializers import AUTHOR_SUMMARY
+from project_hermes.hermes_config import Configurations
+from project_hermes.metrics import record_cache
+
+
+# Serializations cached per object, the full one and the author summary one
+VARIANTS = ('', AUTHOR_SUMMARY)
+
+
+def get_cache_key(model, pk, variant=''):
+    return 'batch:%s:%s:%d' % (model._meta.model_name, variant, pk)
+
+
+def invalidate_batch_cache(model, pks):
+    cache.delete_many([get_cache_key(model, pk, variant) for pk in pks for variant in VARIANTS])
+
+
+class BatchRetrieveMixin:
+    """
+    ViewSet mixin adding a `batch` route returning the objects of the `ids` in order, null for the unknown ones.
+    Honours `?author=summary` through the get_serializer_class of the viewset.
+    """
+
+    batch_select_related = ('author__user',)
+
+    @list_route()
+    def batch(self, request):
+        """
+        Get up to BATCH_MAX_IDS objects at once, the unknown ids are null in the results and listed in missing
+        ---
+        parameters:
+            - name: ids
+              description: comma separated ids
+              paramType: query
+        """
+
+        try:
+            ids = [int(pk) for pk in request.query_params['ids'].split(',') if pk]
+        except (KeyError, ValueError):
+            return Response({'success': False, 'message': 'Incorrect Data Sent'}, status=HTTP_400_BAD_REQUEST)
+        if len(ids) > Configurations.BATCH_MAX_IDS:
+            return Response({'success': False, 'message': 'Too Many Ids'}, status=HTTP_400_BAD_REQUEST)
+
+        queryset = self.get_queryset()
+        serializer_class = self.get_serializer_class()
+        variant = AUTHOR_SUMMARY if request.query_params.get('author') == AUTHOR_SUMMARY else ''
+        keys = OrderedDict((pk, get_cache_key(queryset.model, pk, variant)) for pk in ids)
+        cached = cache.get_many(list(keys.values()))
+        found = {pk: cached[key] for pk, key in keys.items() if key in cached}
+        for pk in keys:
+            record_cache('batch', pk in found)
+
+        remaining = [pk for pk in keys if pk not in found]
+        if remaining:
+            if not variant:
+                queryset = queryset.select_related(*self.batch_select_related)
+            objects = queryset.using(DEFAULT_DB_ALIAS).in_bulk(remaining)
+            serialized = {pk: serializer_class(instance).data for pk, instance in objects.items()}
+            cache.set_many({keys[pk]: data for pk, data in serialized.items()}, Configurations.BATCH_CACHE_TIMEOUT)
+            found.update(serialized)
+
+        response = {
+            'results': [found.get(pk) for pk in ids],
+            'missing': [pk for pk in keys if pk not in found],
+        }
+        return Response(response)
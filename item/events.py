@@ -0,0 +1,118 @@
+"""
+In-process fan-out of item events to the clients streaming a bounding box.
+
+Subscriptions are registered on fixed size tiles, so an event is only matched against the subscriptions of the tile
+it falls into (plus the few that cover too many tiles to be registered on each of them). Events are only seen by the
+subscribers of the worker process that saved the item.
+"""
+
+import json
+import math
+import queue
+import threading
+
+from project_hermes.hermes_config import Configurations
+
+
+class EventTypes:
+    CREATED = 'created'
+    UPDATED = 'updated'
+    STATUS = 'status'
+
+
+class Subscription:
+    def __init__(self, min_latitude, max_latitude, min_longitude, max_longitude):
+        self.min_latitude = min_latitude
+        self.max_latitude = max_latitude
+        self.min_longitude = min_longitude
+        self.max_longitude = max_longitude
+        self.messages = queue.Queue(maxsize=Configurations.EVENT_QUEUE_SIZE)
+        self.dropped = 0
+        self.tiles = []
+
+    def matches(self, latitude, longitude):
+        return self.min_latitude <= latitude <= self.max_latitude and \
+               self.min_longitude <= longitude <= self.max_longitude
+
+    def offer(self, message):
+        # A slow client loses events instead of blocking the request that saved the item
+        try:
+            self.messages.put_nowait(message)
+        except queue.Full:
+            self.dropped += 1
+
+    def get(self, timeout):
+        try:
+            return self.messages.get(timeout=timeout)
+        except queue.Empty:
+            return None
+
+
+class EventBroker:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.tiles = {}
+        self.wide_subscriptions = set()
+        self.count = 0
+
+    @staticmethod
+    def get_tile(latitude, longitude):
+        size = Configurations.EVENT_TILE_SIZE
+        return math.floor(latitude / size), math.floor(longitude / size)
+
+    def get_tiles(self, subscription):
+        min_row, min_column = self.get_tile(subscription.min_latitude, subscription.min_longitude)
+        max_row, max_column = self.get_tile(subscription.max_latitude, subscription.max_longitude)
+        if (max_row - min_row + 1) * (max_column - min_column + 1) > Configurations.EVENT_MAX_TILES:
+            return None
+        return [(row, column) for row in range(min_row, max_row + 1) for column in range(min_column, max_column + 1)]
+
+    def subscribe(self, min_latitude, max_latitude, min_longitude, max_longitude):
+        subscription = Subscription(min_latitude, max_latitude, min_longitude, max_longitude)
+        tiles = self.get_tiles(subscription)
+
+        with self.lock:
+            if tiles is None:
+                self.wide_subscriptions.add(subscription)
+            else:
+                subscription.tiles = tiles
+                for tile in tiles:
+                    self.tiles.setdefault(tile, set()).add(subscription)
+            self.count += 1
+        return subscription
+
+    def unsubscribe(self, subscription):
+        with self.lock:
+            self.wide_subscriptions.discard(subscription)
+            for tile in subscription.tiles:
+                subscriptions = self.tiles.get(tile)
+                if subscriptions is not None:
+                    subscriptions.discard(subscription)
+                    if not subscriptions:
+                        del self.tiles[tile]
+            self.count -= 1
+
+    def get_subscriptions(self, latitude, longitude):
+        with self.lock:
+            candidates = list(self.tiles.get(self.get_tile(latitude, longitude), ()))
+            candidates.extend(self.wide_subscriptions)
+        return [subscription for subscription in candidates if subscription.matches(latitude, longitude)]
+
+    def publish(self, event_type, latitude, longitude, get_payload):
+        """
+        Sends the event to the matching subscriptions, `get_payload` is only called when there is one
+        """
+
+        if not self.count:
+            return
+
+        subscriptions = self.get_subscriptions(latitude, longitude)
+        if not subscriptions:
+            return
+
+        message = 'event: %s\ndata: %s\n\n' % (event_type, json.dumps(get_payload()))
+        for subscription in subscriptions:
+            subscription.offer(message)
+
+
+broker = EventBroker()
@@ -0,0 +1,104 @@
+"""
+Density and average rating grids over a bounding box, aggregated inside the database
+"""
+
+import math
+
+from django.core.cache import cache
+from django.db.models import Avg, Count, F, FloatField, Func, IntegerField, Value
+
+from project_hermes.hermes_config import Configurations
+from project_hermes.metrics import record_cache
+
+
+# Cell sides are powers of 2 ** (1 / GRID_STEPS_PER_OCTAVE) degrees
+GRID_STEPS_PER_OCTAVE = 4
+
+
+class Floor(Func):
+    function = 'FLOOR'
+
+    def as_sqlite(self, compiler, connection):
+        # SQLite has no FLOOR, the cell offsets are never negative so truncating is the same
+        return self.as_sql(compiler, connection, template='CAST(%(expressions)s AS INTEGER)')
+
+
+def _cell_expression(field, minimum, maximum, cells):
+    scale = cells / (maximum - minimum)
+    offset = (F(field) - Value(minimum, output_field=FloatField())) * Value(scale, output_field=FloatField())
+    return Floor(offset, output_field=IntegerField())
+
+
+def build_heatmap(queryset, min_latitude, max_latitude, min_longitude, max_longitude, rows, columns):
+    """
+    Bins the items of the bounding box into a rows x columns grid of counts and mean ratings.
+    The binning is a single GROUP BY on the computed cell keys, so the work done in Python and the size of the
+    result only depend on the grid and never on the number of items.
+    """
+
+    items = queryset.filter(latitude__range=[min_latitude, max_latitude],
+                            longitude__range=[min_longitude, max_longitude])
+    cells = items.annotate(row=_cell_expression('latitude', min_latitude, max_latitude, rows),
+                           column=_cell_expression('longitude', min_longitude, max_longitude, columns)) \
+        .values('row', 'column') \
+        .annotate(count=Count('id'), rating=Avg('rating')) \
+        .order_by()
+
+    counts = [[0] * columns for _ in range(rows)]
+    rating_sums = [[0.0] * columns for _ in range(rows)]
+    for cell in cells:
+        # Items lying exactly on the max edge land one cell outside the grid
+        row = min(int(cell['row']), rows - 1)
+        column = min(int(cell['column']), columns - 1)
+        counts[row][column] += cell['count']
+        rating_sums[row][column] += (cell['rating'] or 0.0) * cell['count']
+
+    ratings = [[rating_sums[row][column] / counts[row][column] if counts[row][column] else None
+                for column in range(columns)] for row in range(rows)]
+
+    return {
+        'min_latitude': min_latitude,
+        'max_latitude': max_latitude,
+        'min_longitude': min_longitude,
+        'max_longitude': max_longitude,
+        'rows': rows,
+        'columns': columns,
+        'counts': counts,
+        'ratings': ratings,
+    }
+
+
+def snap_to_grid(minimum, maximum, cells):
+    """
+    Grows the range to `cells` cells of the global grid, returns the (level, index of the first cell) of the grid.
+    The cell side is rounded up to the next grid level, so the requests of similar zooms over nearby boxes share
+    their grid.
+    """
+
+    level = math.ceil(math.log2((maximum - minimum) / cells) * GRID_STEPS_PER_OCTAVE)
+    while True:
+        size = 2 ** (level / GRID_STEPS_PER_OCTAVE)
+        start = math.floor(minimum / size)
+        if (start + cells) * size >= maximum:
+            return level, start
+        level += 1
+
+
+def get_heatmap(queryset, min_latitude, max_latitude, min_longitude, max_longitude, rows, columns):
+    """
+    Cached wrapper around build_heatmap. The bounding box is first snapped outward to the grid, so panning the map
+    hits the cache, and the heatmap returned holds the snapped bounds.
+    """
+
+    latitude_level, first_row = snap_to_grid(min_latitude, max_latitude, rows)
+    longitude_level, first_column = snap_to_grid(min_longitude, max_longitude, columns)
+    key = 'heatmap:%d:%d:%d:%d:%d:%d' % (latitude_level, first_row, rows, longitude_level, first_column, columns)
+    heatmap = cache.get(key)
+    record_cache('heatmap', heatmap is not None)
+    if heatmap is None:
+        cell_height = 2 ** (latitude_level / GRID_STEPS_PER_OCTAVE)
+        cell_width = 2 ** (longitude_level / GRID_STEPS_PER_OCTAVE)
+        heatmap = build_heatmap(queryset, first_row * cell_height, (first_row + rows) * cell_height,
+                                first_column * cell_width, (first_column + columns) * cell_width, rows, columns)
+        cache.set(key, heatmap, Configurations.HEATMAP_CACHE_TIMEOUT)
+    return heatmap
@@ -0,0 +1,61 @@
+import random
+import time
+
+from django.core.management.base import BaseCommand
+
+from item.models import Item, ItemStatusChoices
+from item.spatial_index import SpatialIndex
+
+
+class Command(BaseCommand):
+    help = 'Benchmarks bounding box searches on the in-process spatial index against the database path'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--points', type=int, default=1000000)
+        parser.add_argument('--queries', type=int, default=200)
+        parser.add_argument('--box-size', type=float, default=0.5, help='Side of the searched box in degrees')
+        parser.add_argument('--database', action='store_true',
+                            help='Also time the same searches on the item table and load the index from it')
+        parser.add_argument('--seed', type=int, default=0)
+
+    def handle(self, *args, **options):
+        generator = random.Random(options['seed'])
+        index = SpatialIndex()
+
+        start = time.monotonic()
+        if options['database']:
+            index.refresh()
+        else:
+            for item_id in range(1, options['points'] + 1):
+                index.upsert(item_id, generator.uniform(-60.0, 60.0), generator.uniform(-180.0, 180.0),
+                             generator.uniform(0.0, 5.0), ItemStatusChoices.VERIFIED)
+        build_time = time.monotonic() - start
+
+        self.stdout.write('Indexed %d points in %.2fs, footprint %.1f MB' %
+                          (len(index), build_time, index.memory_footprint() / 1024.0 / 1024.0))
+
+        size = options['box_size']
+        boxes = []
+        for _ in range(options['queries']):
+            latitude = generator.uniform(-60.0, 60.0 - size)
+            longitude = generator.uniform(-180.0, 180.0 - size)
+            boxes.append((latitude, latitude + size, longitude, longitude + size))
+
+        start = time.monotonic()
+        found = sum(len(index.search(*box)) for box in boxes)
+        index_time = time.monotonic() - start
+        self.stdout.write('Index: %d queries, %d hits, %.3f ms/query' %
+                          (len(boxes), found, index_time * 1000.0 / len(boxes)))
+
+        if not options['database']:
+            return
+
+        start = time.monotonic()
+        found = 0
+        for min_latitude, max_latitude, min_longitude, max_longitude in boxes:
+            found += len(Item.objects.filter(latitude__range=[min_latitude, max_latitude],
+                                             longitude__range=[min_longitude, max_longitude])
+                         .values_list('id', flat=True))
+        database_time = time.monotonic() - start
+        self.stdout.write('Database: %d queries, %d hits, %.3f ms/query' %
+                          (len(boxes), found, database_time * 1000.0 / len(boxes)))
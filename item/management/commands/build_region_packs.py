@@ -0,0 +1,51 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from item.region_packs import get_tiles, get_region_pack, prune_region_packs, take_requested_region_packs
+
+
+class Command(BaseCommand):
+    help = 'Builds the offline region packs of the tiles covering a bounding box, or of the tiles requested through ' \
+           'the API with --requested'
+
+    def add_arguments(self, parser):
+        parser.add_argument('bbox', nargs='?', help='min_latitude,max_latitude,min_longitude,max_longitude')
+        parser.add_argument('--requested', action='store_true',
+                            help='Build the tiles queued by the region_packs route')
+        parser.add_argument('--interval', type=float, default=0,
+                            help='With --requested, keep building every INTERVAL seconds instead of exiting once '
+                                 'the queue is empty')
+        parser.add_argument('--prune', action='store_true',
+                            help='Delete the packs that are not the current version of a tile of the bounding box. '
+                                 'Packs of other tiles are deleted as well.')
+
+    def handle(self, *args, **options):
+        if options['requested']:
+            while True:
+                for row, column in take_requested_region_packs():
+                    self.build(row, column)
+                if not options['interval']:
+                    return
+                time.sleep(options['interval'])
+
+        try:
+            min_latitude, max_latitude, min_longitude, max_longitude = [float(value)
+                                                                        for value in options['bbox'].split(',')]
+        except (AttributeError, ValueError):
+            raise CommandError('Incorrect bbox')
+
+        names = set()
+        for row, column in get_tiles(min_latitude, max_latitude, min_longitude, max_longitude):
+            names.add(self.build(row, column))
+
+        if options['prune']:
+            for name in prune_region_packs(names):
+                self.stdout.write('Pruned %s' % name)
+
+    def build(self, row, column):
+        start = time.monotonic()
+        version, name, size = get_region_pack(row, column, rebuild=True)
+        self.stdout.write('Tile %d:%d version %s, %.1f KB in %.2fs' %
+                          (row, column, version, size / 1024.0, time.monotonic() - start))
+        return name
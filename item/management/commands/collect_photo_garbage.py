@@ -0,0 +1,78 @@
+import os
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Count
+from django.utils import timezone
+
+from item.models import Photo, StoredFile
+from item.storage import CONTENT_ADDRESSED_DIRECTORY
+
+
+class Command(BaseCommand):
+    help = 'Recounts the references of the content addressed photo files and deletes the unreferenced ones'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--min-age', type=float, default=24,
+                            help='Hours a file must have existed before it can be collected, protects uploads '
+                                 'that are still running')
+        parser.add_argument('--dry-run', action='store_true')
+
+    def handle(self, *args, **options):
+        cutoff = timezone.now() - timedelta(hours=options['min_age'])
+        dry_run = options['dry_run']
+
+        # Candidates from a snapshot, every one is checked again under its row lock: an upload storing the same
+        # content holds that lock until its photo is committed
+        references = dict(Photo.objects.values_list('picture').annotate(Count('pk')).order_by())
+        stored_files = StoredFile.objects.values_list('id', 'name', 'references', 'created')
+        candidates = [pk for pk, name, count, created in stored_files
+                      if count != references.get(name, 0) or (not count and created < cutoff)]
+
+        drifted = 0
+        freed = 0
+        for pk in candidates:
+            with transaction.atomic():
+                stored = StoredFile.objects.select_for_update().filter(pk=pk).first()
+                if not stored:
+                    continue
+                count = Photo.objects.filter(picture=stored.name).count()
+                if count == 0 and stored.created < cutoff:
+                    self.stdout.write('Collecting %s' % stored.name)
+                    freed += stored.size
+                    if not dry_run:
+                        # Removed before the commit, a concurrent upload of the content waits for the lock and
+                        # then writes the file again under a new row
+                        self.remove(os.path.join(settings.MEDIA_ROOT, stored.name))
+                        stored.delete()
+                elif count != stored.references:
+                    drifted += 1
+                    if not dry_run:
+                        StoredFile.objects.filter(pk=pk).update(references=count)
+        self.stdout.write('%d stored files with a drifted reference count' % drifted)
+
+        # Files left behind by interrupted writes, they never got a StoredFile row
+        known = set(StoredFile.objects.values_list('name', flat=True))
+        root = os.path.join(settings.MEDIA_ROOT, CONTENT_ADDRESSED_DIRECTORY)
+        oldest = time.time() - options['min_age'] * 3600
+        for directory, _, file_names in os.walk(root):
+            for file_name in file_names:
+                path = os.path.join(directory, file_name)
+                name = os.path.relpath(path, settings.MEDIA_ROOT).replace(os.sep, '/')
+                if name not in known and os.path.getmtime(path) < oldest:
+                    self.stdout.write('Collecting untracked %s' % name)
+                    freed += os.path.getsize(path)
+                    if not dry_run:
+                        self.remove(path)
+
+        self.stdout.write('%s %.1f MB' % ('Would free' if dry_run else 'Freed', freed / 1024.0 / 1024.0))
+
+    @staticmethod
+    def remove(path):
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
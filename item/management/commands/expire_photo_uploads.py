@@ -0,0 +1,64 @@
+import os
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.utils import timezone
+
+from item.models import PhotoUpload
+from project_hermes.hermes_config import Configurations
+
+
+class Command(BaseCommand):
+    help = 'Deletes the photo uploads left unfinished for longer than PHOTO_UPLOAD_TTL, along with their part files'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--dry-run', action='store_true')
+
+    def handle(self, *args, **options):
+        dry_run = options['dry_run']
+        cutoff = timezone.now() - timedelta(seconds=Configurations.PHOTO_UPLOAD_TTL)
+
+        expired = 0
+        freed = 0
+        for pk in PhotoUpload.objects.filter(photo=None, created__lt=cutoff).values_list('pk', flat=True):
+            with transaction.atomic():
+                # Waits for a chunk still being written to the upload
+                upload = PhotoUpload.objects.select_for_update().filter(pk=pk, photo=None).first()
+                if not upload:
+                    continue
+                expired += 1
+                freed += self.get_size(upload.get_path())
+                if not dry_run:
+                    self.remove(upload.get_path())
+                    upload.delete()
+
+        # Part files whose row is gone, left behind by a crash or a deleted item
+        directory = os.path.join(settings.MEDIA_ROOT, 'uploads')
+        oldest = time.time() - Configurations.PHOTO_UPLOAD_TTL
+        known = {'%s.part' % pk for pk in PhotoUpload.objects.values_list('pk', flat=True)}
+        for file_name in os.listdir(directory) if os.path.isdir(directory) else []:
+            path = os.path.join(directory, file_name)
+            if file_name not in known and os.path.getmtime(path) < oldest:
+                freed += self.get_size(path)
+                if not dry_run:
+                    self.remove(path)
+
+        self.stdout.write('%d expired uploads, %s %.1f MB' % (expired, 'would free' if dry_run else 'freed',
+                                                             freed / 1024.0 / 1024.0))
+
+    @staticmethod
+    def get_size(path):
+        try:
+            return os.path.getsize(path)
+        except FileNotFoundError:
+            return 0
+
+    @staticmethod
+    def remove(path):
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
@@ -0,0 +1,25 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from item.views import flush_pending_reactions
+
+
+class Command(BaseCommand):
+    help = 'Applies the reactions buffered in write-behind mode'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000)
+        parser.add_argument('--interval', type=float, default=0,
+                            help='Keep flushing every INTERVAL seconds instead of exiting once the buffer is empty')
+
+    def handle(self, *args, **options):
+        while True:
+            flushed = flush_pending_reactions(options['batch_size'])
+            while flushed:
+                self.stdout.write('Applied %d reactions' % flushed)
+                flushed = flush_pending_reactions(options['batch_size'])
+
+            if not options['interval']:
+                return
+            time.sleep(options['interval'])
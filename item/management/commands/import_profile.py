@@ -0,0 +1,41 @@
+import os
+import subprocess
+import sys
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+IMPORT_SCRIPT = 'import django; django.setup(); import %s'
+
+
+class Command(BaseCommand):
+    help = 'Reports the slowest imports of a cold worker start, as measured by python -X importtime'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--module', default='project_hermes.urls', help='Module imported after django.setup()')
+        parser.add_argument('--top', type=int, default=25)
+
+    def handle(self, *args, **options):
+        if sys.version_info < (3, 7):
+            raise CommandError('-X importtime needs Python 3.7 or newer')
+
+        result = subprocess.run([sys.executable, '-X', 'importtime', '-c', IMPORT_SCRIPT % options['module']],
+                                stdout=subprocess.PIPE, stderr=subprocess.PIPE, universal_newlines=True,
+                                env=dict(os.environ, DJANGO_SETTINGS_MODULE=settings.SETTINGS_MODULE),
+                                cwd=settings.BASE_DIR)
+
+        imports = []
+        for line in result.stderr.splitlines():
+            if not line.startswith('import time:') or 'cumulative' in line:
+                continue
+            own, cumulative, module = line[len('import time:'):].split('|')
+            imports.append((int(cumulative), int(own), module.rstrip()))
+
+        if result.returncode or not imports:
+            raise CommandError('Importing %s failed:\n%s' % (options['module'], result.stderr[-2000:]))
+
+        total = sum(own for _, own, _ in imports)
+        self.stdout.write('%d modules imported in %.1f ms' % (len(imports), total / 1000.0))
+        self.stdout.write('%12s %12s  %s' % ('cumulative', 'self', 'module'))
+        for cumulative, own, module in sorted(imports, reverse=True)[:options['top']]:
+            self.stdout.write('%9.1f ms %9.1f ms  %s' % (cumulative / 1000.0, own / 1000.0, module))
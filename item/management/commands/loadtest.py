@@ -0,0 +1,219 @@
+import asyncio
+import base64
+import bisect
+import itertools
+import json
+import random
+import time
+from urllib.parse import urlsplit
+
+from django.core.management.base import BaseCommand, CommandError
+
+DEFAULT_MIX = 'pan=60,create=2,rate=10,comment=5,upvote=10,downvote=8,flag=5'
+VOTE_ACTIONS = ('upvote', 'downvote', 'flag')
+
+
+def percentile(values, fraction):
+    if not values:
+        return 0.0
+    return values[min(len(values) - 1, int(fraction * len(values)))]
+
+
+class Client:
+    """
+    Minimal asyncio HTTP/1.1 client, one connection per request so the server sees independent users
+    """
+
+    def __init__(self, url, username, password):
+        parts = urlsplit(url)
+        self.host = parts.hostname
+        self.port = parts.port or 80
+        self.prefix = parts.path.rstrip('/')
+        self.authorization = None
+        if username:
+            credentials = ('%s:%s' % (username, password)).encode('utf-8')
+            self.authorization = 'Basic ' + base64.b64encode(credentials).decode('ascii')
+
+    async def request(self, method, path, data=None):
+        body = json.dumps(data).encode('utf-8') if data is not None else b''
+        headers = [
+            '%s %s%s HTTP/1.1' % (method, self.prefix, path),
+            'Host: %s:%d' % (self.host, self.port),
+            'Connection: close',
+            'Accept: application/json',
+            'Content-Type: application/json',
+            'Content-Length: %d' % len(body),
+        ]
+        if self.authorization:
+            headers.append('Authorization: ' + self.authorization)
+
+        reader, writer = await asyncio.open_connection(self.host, self.port)
+        try:
+            writer.write(('\r\n'.join(headers) + '\r\n\r\n').encode('latin-1') + body)
+            await writer.drain()
+            response = await reader.read()
+        finally:
+            writer.close()
+
+        head, _, content = response.partition(b'\r\n\r\n')
+        status = int(head.split(b' ', 2)[1]) if head else 0
+        return status, content
+
+
+class Command(BaseCommand):
+    help = 'Replays a configurable mix of map, write and vote traffic against a running server and reports ' \
+           'throughput, latency percentiles, error rates and the contention on hot items'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--url', default='http://127.0.0.1:8000/api')
+        parser.add_argument('--username', help='Basic authentication user for the write actions')
+        parser.add_argument('--password', default='')
+        parser.add_argument('--concurrency', type=int, default=20)
+        parser.add_argument('--duration', type=float, default=30.0, help='Seconds of traffic')
+        parser.add_argument('--mix', default=DEFAULT_MIX, help='Weights of pan, create, rate, comment, upvote, '
+                                                                'downvote and flag')
+        parser.add_argument('--bbox', default='12.8,13.2,77.4,77.8',
+                            help='min_latitude,max_latitude,min_longitude,max_longitude of the traffic')
+        parser.add_argument('--pan-size', type=float, default=0.05, help='Side in degrees of the panned viewports')
+        parser.add_argument('--hot-items', type=int, default=3,
+                            help='Number of comments receiving --hot-ratio of the votes')
+        parser.add_argument('--hot-ratio', type=float, default=0.8)
+        parser.add_argument('--seed', type=int, default=0)
+
+    def handle(self, *args, **options):
+        try:
+            self.mix = {action: float(weight) for action, weight in
+                        (entry.split('=') for entry in options['mix'].split(','))}
+            self.bbox = [float(value) for value in options['bbox'].split(',')]
+        except ValueError:
+            raise CommandError('Incorrect --mix or --bbox')
+
+        writes = set(self.mix) - {'pan'}
+        if writes and not options['username']:
+            raise CommandError('--username is required for %s' % ', '.join(sorted(writes)))
+
+        self.options = options
+        self.random = random.Random(options['seed'])
+        self.client = Client(options['url'], options['username'], options['password'])
+        self.latencies = {}
+        self.errors = {}
+
+        loop = asyncio.get_event_loop()
+        loop.run_until_complete(self.setup())
+        start = time.monotonic()
+        loop.run_until_complete(asyncio.gather(*[self.worker(start + options['duration'])
+                                                 for _ in range(options['concurrency'])]))
+        self.report(time.monotonic() - start)
+
+    def random_point(self):
+        min_latitude, max_latitude, min_longitude, max_longitude = self.bbox
+        return self.random.uniform(min_latitude, max_latitude), self.random.uniform(min_longitude, max_longitude)
+
+    async def setup(self):
+        min_latitude, max_latitude, min_longitude, max_longitude = self.bbox
+        status, content = await self.client.request('POST', '/item/search_bounding_box/', {
+            'min_latitude': min_latitude, 'max_latitude': max_latitude,
+            'min_longitude': min_longitude, 'max_longitude': max_longitude,
+        })
+        if status != 200:
+            raise CommandError('Bounding box search failed with %d' % status)
+        self.item_ids = [item['id'] for item in json.loads(content.decode('utf-8'))['results']]
+
+        if not self.item_ids and self.options['username']:
+            for _ in range(10):
+                await self.create_item()
+        if not self.item_ids:
+            raise CommandError('No items in the bounding box to drive traffic against')
+
+        self.comment_ids = []
+        for item_id in self.item_ids[:50]:
+            status, content = await self.client.request('GET', '/item/%d/get_comments/' % item_id)
+            if status == 200:
+                self.comment_ids.extend(comment['id'] for comment in json.loads(content.decode('utf-8'))['results'])
+        if not self.comment_ids and self.options['username']:
+            for item_id in self.item_ids[:10]:
+                await self.add_comment(item_id)
+        self.hot_comment_ids = self.comment_ids[:self.options['hot_items']]
+        self.stdout.write('Driving traffic over %d items and %d comments (%d hot)' %
+                          (len(self.item_ids), len(self.comment_ids), len(self.hot_comment_ids)))
+
+    async def create_item(self):
+        latitude, longitude = self.random_point()
+        status, content = await self.client.request('POST', '/item/', {
+            'title': 'Load test item', 'description': 'Created by loadtest',
+            'latitude': latitude, 'longitude': longitude,
+        })
+        if status == 200:
+            self.item_ids.append(json.loads(content.decode('utf-8'))['id'])
+        return status
+
+    async def add_comment(self, item_id):
+        status, content = await self.client.request('POST', '/item/%d/add_comment/' % item_id,
+                                                    {'description': 'Load test comment'})
+        if status == 200:
+            self.comment_ids.append(json.loads(content.decode('utf-8'))['result']['id'])
+        return status
+
+    async def run_action(self, action):
+        if action == 'pan':
+            latitude, longitude = self.random_point()
+            size = self.options['pan_size']
+            status, _ = await self.client.request('POST', '/item/search_bounding_box/', {
+                'min_latitude': latitude, 'max_latitude': latitude + size,
+                'min_longitude': longitude, 'max_longitude': longitude + size,
+            })
+            return action, status
+        if action == 'create':
+            return action, await self.create_item()
+        if action == 'rate':
+            status, _ = await self.client.request('POST', '/item/%d/add_rating/' % self.random.choice(self.item_ids),
+                                                  {'rating': self.random.randint(0, 5)})
+            return action, status
+        if action == 'comment':
+            return action, await self.add_comment(self.random.choice(self.item_ids))
+        if action in VOTE_ACTIONS:
+            hot = self.hot_comment_ids and self.random.random() < self.options['hot_ratio']
+            comment_id = self.random.choice(self.hot_comment_ids if hot else self.comment_ids)
+            status, _ = await self.client.request('POST', '/comment/%d/%s/' % (comment_id, action))
+            return '%s:%s' % (action, 'hot' if hot else 'cold'), status
+        raise CommandError('Unknown action %s' % action)
+
+    async def worker(self, deadline):
+        actions = list(self.mix)
+        cumulative_weights = list(itertools.accumulate(self.mix[action] for action in actions))
+        while time.monotonic() < deadline:
+            action = actions[bisect.bisect(cumulative_weights, self.random.random() * cumulative_weights[-1])]
+            if action in VOTE_ACTIONS and not self.comment_ids:
+                continue
+
+            start = time.monotonic()
+            try:
+                name, status = await self.run_action(action)
+            except (OSError, ValueError, KeyError):
+                name, status = action, 0
+            self.latencies.setdefault(name, []).append(time.monotonic() - start)
+            if not 200 <= status < 300:
+                self.errors[name] = self.errors.get(name, 0) + 1
+
+    def report(self, elapsed):
+        total = sum(len(latencies) for latencies in self.latencies.values())
+        self.stdout.write('%d requests in %.1fs, %.1f requests/s, %d errors' %
+                          (total, elapsed, total / elapsed, sum(self.errors.values())))
+        self.stdout.write('%-16s %8s %8s %8s %9s %9s %9s %9s' %
+                          ('action', 'count', 'req/s', 'errors', 'p50 ms', 'p90 ms', 'p99 ms', 'max ms'))
+
+        percentiles = {}
+        for name in sorted(self.latencies):
+            latencies = sorted(self.latencies[name])
+            percentiles[name] = (percentile(latencies, 0.5), percentile(latencies, 0.99))
+            self.stdout.write('%-16s %8d %8.1f %7.1f%% %9.1f %9.1f %9.1f %9.1f' % (
+                name, len(latencies), len(latencies) / elapsed, 100.0 * self.errors.get(name, 0) / len(latencies),
+                percentiles[name][0] * 1000, percentile(latencies, 0.9) * 1000,
+                percentiles[name][1] * 1000, latencies[-1] * 1000))
+
+        # Votes on the hot comments serialize on the same rows, the gap to the cold ones is the lock contention
+        for action in VOTE_ACTIONS:
+            hot, cold = percentiles.get(action + ':hot'), percentiles.get(action + ':cold')
+            if hot and cold and cold[0] and cold[1]:
+                self.stdout.write('%s contention: hot/cold p50 x%.2f, p99 x%.2f' %
+                                  (action, hot[0] / cold[0], hot[1] / cold[1]))
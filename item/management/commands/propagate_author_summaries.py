@@ -0,0 +1,65 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import CharField, IntegerField
+
+from account.models import UserProfile
+from item.batch import invalidate_batch_cache
+from item.models import Item, Comment, Photo
+from item.views import update_values
+from project_hermes.hermes_config import Configurations
+
+
+def propagate_author_summaries(batch_size):
+    """
+    Rewrites the author name and tier of the content of a batch of stale profiles, two UPDATEs per content table.
+    Returns the number of profiles propagated.
+    """
+
+    with transaction.atomic():
+        profile_ids = list(UserProfile.objects.filter(author_summary_stale=True).order_by('pk')
+                           .values_list('pk', flat=True)[:batch_size])
+        if not profile_ids:
+            return 0
+        # Cleared before the profiles are read, a change made meanwhile flags the profile again for the next batch
+        UserProfile.objects.filter(pk__in=profile_ids).update(author_summary_stale=False)
+
+        names = {}
+        tiers = {}
+        for profile in UserProfile.objects.filter(pk__in=profile_ids).select_related('user'):
+            names[profile.pk] = profile.get_display_name()
+            tiers[profile.pk] = UserProfile.get_tier(profile.reputation)
+
+        for manager in (Item.all_objects, Comment.objects, Photo.objects):
+            update_values(manager.all(), 'author_name', names, key='author', output_field=CharField())
+            update_values(manager.all(), 'author_tier', tiers, key='author', output_field=IntegerField())
+
+    # After the commit, so a batch request cannot cache the old summary again
+    for model, manager in ((Item, Item.all_objects), (Comment, Comment.objects), (Photo, Photo.objects)):
+        invalidate_batch_cache(model, manager.filter(author__in=profile_ids).values_list('pk', flat=True))
+    return len(profile_ids)
+
+
+class Command(BaseCommand):
+    help = 'Copies the display name and tier of the changed profiles to the author summary of their content'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=Configurations.AUTHOR_SUMMARY_BATCH_SIZE)
+        parser.add_argument('--interval', type=float, default=0,
+                            help='Keep running, waiting this many seconds whenever there is nothing to propagate')
+
+    def handle(self, *args, **options):
+        while True:
+            propagated = 0
+            while True:
+                count = propagate_author_summaries(options['batch_size'])
+                if not count:
+                    break
+                propagated += count
+            if propagated:
+                self.stdout.write('Propagated the author summary of %d profiles' % propagated)
+
+            if not options['interval']:
+                break
+            time.sleep(options['interval'])
@@ -0,0 +1,28 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Count
+
+from item.models import Item, Rating, RatingHistogram
+from item.views import update_values
+
+
+class Command(BaseCommand):
+    help = 'Rebuilds the rating histograms and the average rating of every item from the ratings'
+
+    def handle(self, *args, **options):
+        histograms = []
+        ratings = {}
+        rows = Rating.objects.values('item').annotate(count=Count('id'), **RatingHistogram.get_aggregates()) \
+            .order_by()
+        for row in rows.iterator():
+            item_id = row.pop('item')
+            ratings[item_id] = row['total'] / row.pop('count')
+            histograms.append(RatingHistogram(item_id=item_id, **row))
+
+        with transaction.atomic():
+            RatingHistogram.objects.all().delete()
+            RatingHistogram.objects.bulk_create(histograms, batch_size=1000)
+            updated = update_values(Item.all_objects.all(), 'rating', ratings)
+            Item.all_objects.exclude(pk__in=Rating.objects.values('item')).exclude(rating=0.0).update(rating=0.0)
+
+        self.stdout.write('Rebuilt %d rating histograms, %d item ratings updated' % (len(histograms), updated))
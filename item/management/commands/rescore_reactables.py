@@ -0,0 +1,145 @@
+import time
+
+import numpy
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Count, Sum
+
+from account.models import UserProfile, LeaderboardEntry
+from item.models import Item, Reactable, Reaction, Comment, Photo
+from item.views import update_values, mark_tier_changes
+
+
+def vectorized_score(counts, thresholds, scores):
+    """
+    Array version of Reactable.convert_to_score, the score of the highest threshold strictly below each count
+    """
+
+    positions = numpy.searchsorted(numpy.asarray(thresholds), counts, side='left') - 1
+    values = numpy.asarray(scores, dtype=numpy.float64)[numpy.clip(positions, 0, len(scores) - 1)]
+    return numpy.where(positions >= 0, values, 0.0)
+
+
+def vectorized_scores(upvotes, downvotes, flags):
+    return Reactable.BASE_SCORE \
+           - vectorized_score(flags, Reactable.FLAG_THRESHOLDS, Reactable.SCORES) \
+           - vectorized_score(downvotes, Reactable.DOWNVOTE_THRESHOLDS, Reactable.SCORES) \
+           + vectorized_score(upvotes, Reactable.UPVOTE_THRESHOLDS, Reactable.SCORES)
+
+
+class Command(BaseCommand):
+    help = 'Recomputes the score of every reactable and the reputation of every user in one vectorized pass'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--dry-run', action='store_true', help='Only report what would change')
+        parser.add_argument('--chunk-size', type=int, default=1000)
+        parser.add_argument('--benchmark', action='store_true',
+                            help='Also time the per-object Reactable.recalculate_score path on the same rows')
+        parser.add_argument('--show', type=int, default=10, help='Number of the largest changes to list')
+
+    def progress(self, message, start):
+        self.stdout.write('[%7.2fs] %s' % (time.monotonic() - start, message))
+
+    def load_columns(self, queryset, fields, dtypes, start):
+        rows = list(queryset.values_list(*fields).iterator())
+        self.progress('Loaded %d %s rows' % (len(rows), queryset.model.__name__), start)
+        if not rows:
+            return [numpy.zeros(0, dtype=dtype) for dtype in dtypes]
+        return [numpy.fromiter((row[index] for row in rows), dtype=dtype, count=len(rows))
+                for index, dtype in enumerate(dtypes)]
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            columns = self.rescore(options)
+        if options['benchmark']:
+            self.benchmark(*columns)
+
+    def rescore(self, options):
+        """
+        Runs in one transaction. Unless it is a dry run, the reactables and then the profiles are locked as they are
+        read, in primary key order like the vote path does, so no vote or reputation change made meanwhile is
+        overwritten by the UPDATEs.
+        """
+
+        start = time.monotonic()
+
+        reactables = Reactable.objects.order_by()
+        profiles = UserProfile.objects.order_by()
+        if not options['dry_run']:
+            reactables = reactables.select_for_update().order_by('pk')
+            profiles = profiles.select_for_update().order_by('pk')
+
+        reactable_ids, upvotes, downvotes, flags, experiences = self.load_columns(
+                reactables, ('id', 'upvotes', 'downvotes', 'flags', 'experience'),
+                (numpy.int64, numpy.int64, numpy.int64, numpy.int64, numpy.float64), start)
+        profile_ids, reputations = self.load_columns(
+                profiles, ('id', 'reputation'), (numpy.int64, numpy.float64), start)
+
+        order = numpy.argsort(reactable_ids)
+        reactable_ids, upvotes, downvotes, flags, experiences = \
+            reactable_ids[order], upvotes[order], downvotes[order], flags[order], experiences[order]
+        order = numpy.argsort(profile_ids)
+        profile_ids, reputations = profile_ids[order], reputations[order]
+
+        scoring_start = time.monotonic()
+        scores = vectorized_scores(upvotes, downvotes, flags)
+        scoring_time = time.monotonic() - scoring_start
+        self.progress('Scored %d reactables' % len(scores), start)
+
+        # Experience of the comments and photos, summed per author
+        new_reputations = numpy.zeros(len(profile_ids), dtype=numpy.float64)
+        for model in (Comment, Photo):
+            ids, authors = self.load_columns(model.objects.order_by(), ('reactable_ptr', 'author'),
+                                             (numpy.int64, numpy.int64), start)
+            positions = numpy.searchsorted(reactable_ids, ids)
+            numpy.add.at(new_reputations, numpy.searchsorted(profile_ids, authors), scores[positions])
+
+        for author_id, count in Reaction.objects.values_list('author').annotate(Count('id')).order_by():
+            new_reputations[numpy.searchsorted(profile_ids, author_id)] += count
+        for author_id, rating, item_flags in Item.all_objects.values_list('author') \
+                .annotate(Sum('rating'), Sum('flags')).order_by():
+            new_reputations[numpy.searchsorted(profile_ids, author_id)] += rating * 2 - item_flags * 10
+        self.progress('Aggregated reputations of %d users' % len(profile_ids), start)
+
+        changed_scores = numpy.flatnonzero(~numpy.isclose(scores, experiences))
+        changed_reputations = numpy.flatnonzero(~numpy.isclose(new_reputations, reputations))
+        self.stdout.write('%d of %d scores and %d of %d reputations change' %
+                          (len(changed_scores), len(scores), len(changed_reputations), len(reputations)))
+
+        deltas = new_reputations[changed_reputations] - reputations[changed_reputations]
+        for position in changed_reputations[numpy.argsort(-numpy.abs(deltas))][:options['show']]:
+            self.stdout.write('  user %d: %.2f -> %.2f' %
+                              (profile_ids[position], reputations[position], new_reputations[position]))
+
+        columns = upvotes, downvotes, flags, scoring_time
+        if options['dry_run']:
+            return columns
+
+        chunk_size = options['chunk_size']
+        for offset in range(0, len(changed_scores), chunk_size):
+            chunk = changed_scores[offset:offset + chunk_size]
+            update_values(Reactable.objects.all(), 'experience',
+                          {int(reactable_ids[index]): float(scores[index]) for index in chunk})
+            self.progress('Wrote %d/%d scores' % (offset + len(chunk), len(changed_scores)), start)
+
+        for offset in range(0, len(changed_reputations), chunk_size):
+            chunk = changed_reputations[offset:offset + chunk_size]
+            values = {int(profile_ids[index]): float(new_reputations[index]) for index in chunk}
+            update_values(UserProfile.objects.all(), 'reputation', values)
+            update_values(LeaderboardEntry.objects.all(), 'reputation', values, key='profile')
+            mark_tier_changes({int(profile_ids[index]): float(reputations[index]) for index in chunk}, values)
+            self.progress('Wrote %d/%d reputations' % (offset + len(chunk), len(changed_reputations)), start)
+        return columns
+
+    def benchmark(self, upvotes, downvotes, flags, scoring_time):
+        reactables = [Reactable(upvotes=int(up), downvotes=int(down), flags=int(flag))
+                      for up, down, flag in zip(upvotes, downvotes, flags)]
+
+        object_start = time.monotonic()
+        object_scores = numpy.array([Reactable.recalculate_score(reactable) for reactable in reactables])
+        object_time = time.monotonic() - object_start
+
+        vectorized = vectorized_scores(upvotes, downvotes, flags)
+        self.stdout.write('Per-object scoring: %.4fs, vectorized: %.4fs, results %s' %
+                          (object_time, scoring_time,
+                           'match' if numpy.allclose(object_scores, vectorized) else 'DIFFER'))
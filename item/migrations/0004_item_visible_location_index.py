@@ -0,0 +1,25 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+    """
+    Partial indexes matching the VisibleItemManager predicate, hidden items never enter them
+    """
+
+    dependencies = [
+        ('item', '0003_item_modified'),
+    ]
+
+    operations = [
+        migrations.RunSQL(
+            'CREATE INDEX item_item_visible_location ON item_item (latitude, longitude) WHERE status IN (0, 1)',
+            reverse_sql='DROP INDEX item_item_visible_location',
+        ),
+        migrations.RunSQL(
+            'CREATE INDEX item_item_visible_status_id ON item_item (status, id) WHERE status IN (0, 1)',
+            reverse_sql='DROP INDEX item_item_visible_status_id',
+        ),
+    ]
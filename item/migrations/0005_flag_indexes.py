@@ -0,0 +1,22 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('item', '0004_item_visible_location_index'),
+    ]
+
+    operations = [
+        migrations.AlterIndexTogether(
+            name='item',
+            index_together=set([('flags', 'timestamp')]),
+        ),
+        migrations.AlterIndexTogether(
+            name='reactable',
+            index_together=set([('flags', 'timestamp')]),
+        ),
+    ]
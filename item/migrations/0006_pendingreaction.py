@@ -0,0 +1,26 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('account', '0003_leaderboard'),
+        ('item', '0005_flag_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PendingReaction',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('action', models.CharField(choices=[('upvote', 'Upvote'), ('downvote', 'Downvote'), ('flag', 'Flag'), ('unflag', 'Unflag'), ('unvote', 'Unvote')], max_length=8)),
+                ('timestamp', models.DateTimeField(auto_now_add=True)),
+                ('author', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='account.UserProfile')),
+                ('reactable', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='pending_reactions', to='item.Reactable')),
+            ],
+        ),
+    ]
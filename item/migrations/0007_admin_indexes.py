@@ -0,0 +1,37 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('item', '0006_pendingreaction'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='item',
+            name='timestamp',
+            field=models.DateTimeField(auto_now_add=True, db_index=True),
+        ),
+        migrations.AlterField(
+            model_name='reactable',
+            name='timestamp',
+            field=models.DateTimeField(auto_now_add=True, db_index=True),
+        ),
+        migrations.AlterField(
+            model_name='reaction',
+            name='timestamp',
+            field=models.DateTimeField(auto_now_add=True, db_index=True),
+        ),
+        migrations.AlterIndexTogether(
+            name='item',
+            index_together=set([('flags', 'timestamp'), ('status', 'timestamp')]),
+        ),
+        migrations.AlterIndexTogether(
+            name='reaction',
+            index_together=set([('reaction', 'timestamp')]),
+        ),
+    ]
@@ -0,0 +1,33 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('account', '0003_leaderboard'),
+        ('item', '0009_storedfile'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ActivityEntry',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('verb', models.CharField(choices=[('item', 'Item'), ('comment', 'Comment'), ('photo', 'Photo'), ('rating', 'Rating'), ('upvote', 'Upvote'), ('downvote', 'Downvote'), ('flag', 'Flag')], max_length=8)),
+                ('value', models.FloatField(blank=True, null=True)),
+                ('timestamp', models.DateTimeField(auto_now_add=True)),
+                ('actor', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='account.UserProfile')),
+                ('item', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='item.Item')),
+                ('owner', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='activity', to='account.UserProfile')),
+                ('reactable', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='+', to='item.Reactable')),
+            ],
+        ),
+        migrations.AlterIndexTogether(
+            name='activityentry',
+            index_together=set([('owner', 'id')]),
+        ),
+    ]
@@ -0,0 +1,54 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+from django.db.models import Case, Sum, When
+import django.db.models.deletion
+
+
+def backfill_histograms(apps, schema_editor):
+    """
+    Histograms of the items rated so far, same buckets as RatingHistogram.get_field (ratings rounded half up)
+    """
+
+    Rating = apps.get_model('item', 'Rating')
+    RatingHistogram = apps.get_model('item', 'RatingHistogram')
+
+    aggregates = {'total': Sum('rating')}
+    for star in range(6):
+        conditions = {}
+        if star != 0:
+            conditions['rating__gte'] = star - 0.5
+        if star != 5:
+            conditions['rating__lt'] = star + 0.5
+        aggregates['bucket_%d' % star] = Sum(Case(When(then=1, **conditions), default=0,
+                                                  output_field=models.IntegerField()))
+
+    histograms = []
+    for row in Rating.objects.values('item').annotate(**aggregates).order_by().iterator():
+        histograms.append(RatingHistogram(item_id=row.pop('item'), **row))
+    RatingHistogram.objects.bulk_create(histograms, batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('item', '0010_activityentry'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RatingHistogram',
+            fields=[
+                ('item', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='rating_histogram', serialize=False, to='item.Item')),
+                ('bucket_0', models.IntegerField(default=0)),
+                ('bucket_1', models.IntegerField(default=0)),
+                ('bucket_2', models.IntegerField(default=0)),
+                ('bucket_3', models.IntegerField(default=0)),
+                ('bucket_4', models.IntegerField(default=0)),
+                ('bucket_5', models.IntegerField(default=0)),
+                ('total', models.FloatField(default=0.0)),
+            ],
+        ),
+        migrations.RunPython(backfill_histograms, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,45 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('account', '0004_userprofile_author_summary_stale'),
+        ('item', '0011_ratinghistogram'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='item',
+            name='author_name',
+            field=models.CharField(blank=True, default='', max_length=150),
+        ),
+        migrations.AddField(
+            model_name='item',
+            name='author_tier',
+            field=models.SmallIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='comment',
+            name='author_name',
+            field=models.CharField(blank=True, default='', max_length=150),
+        ),
+        migrations.AddField(
+            model_name='comment',
+            name='author_tier',
+            field=models.SmallIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='photo',
+            name='author_name',
+            field=models.CharField(blank=True, default='', max_length=150),
+        ),
+        migrations.AddField(
+            model_name='photo',
+            name='author_tier',
+            field=models.SmallIntegerField(default=0),
+        ),
+    ]
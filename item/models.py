@@ -1,8 +1,17 @@
 from __future__ import unicode_literals
 
+import math
+import os
+import uuid
+from datetime import timedelta
+
+from django.conf import settings
 from django.db import models
+from django.db.models import Case, F, Sum, When
+from django.utils import timezone
 
 from account.models import UserProfile
+from project_hermes.hermes_config import Configurations
 
 
 class ItemStatusChoices:
@@ -22,6 +31,12 @@ class ItemStatusChoices:
                 (cls.DELETED, 'Deleted'),
                 (cls.REMOVED, 'Removed')]
 
+    @classmethod
+    def visible(cls):
+        if Configurations.SHOW_UNVERIFIED_ITEMS:
+            return [cls.VERIFIED, cls.UNVERIFIED]
+        return [cls.VERIFIED]
+
 
 class ReactionChoices:
     NONE = 0
@@ -37,6 +52,51 @@ class ReactionChoices:
                 (cls.FLAG, 'Flag')]
 
 
+class ReactionActions:
+    UPVOTE = 'upvote'
+    DOWNVOTE = 'downvote'
+    FLAG = 'flag'
+    UNFLAG = 'unflag'
+    UNVOTE = 'unvote'
+
+    @classmethod
+    def get(cls):
+        return [(cls.UPVOTE, 'Upvote'),
+                (cls.DOWNVOTE, 'Downvote'),
+                (cls.FLAG, 'Flag'),
+                (cls.UNFLAG, 'Unflag'),
+                (cls.UNVOTE, 'Unvote')]
+
+
+class ActivityVerbs:
+    ITEM = 'item'
+    COMMENT = 'comment'
+    PHOTO = 'photo'
+    RATING = 'rating'
+    UPVOTE = 'upvote'
+    DOWNVOTE = 'downvote'
+    FLAG = 'flag'
+
+    @classmethod
+    def get(cls):
+        return [(cls.ITEM, 'Item'),
+                (cls.COMMENT, 'Comment'),
+                (cls.PHOTO, 'Photo'),
+                (cls.RATING, 'Rating'),
+                (cls.UPVOTE, 'Upvote'),
+                (cls.DOWNVOTE, 'Downvote'),
+                (cls.FLAG, 'Flag')]
+
+
+class VisibleItemManager(models.Manager):
+    """
+    Manager which only returns the items that can be shown to the users
+    """
+
+    def get_queryset(self):
+        return super().get_queryset().filter(status__in=ItemStatusChoices.visible())
+
+
 class Item(models.Model):
     """
     The Location Based Crowd sourced object
@@ -45,13 +105,24 @@ class Item(models.Model):
     title = models.TextField(max_length=256, blank=False)
     description = models.TextField(blank=True)
     author = models.ForeignKey(UserProfile)
+    # Snapshot of the author for the serializers, kept in sync by propagate_author_summaries
+    author_name = models.CharField(max_length=150, blank=True, default='')
+    author_tier = models.SmallIntegerField(default=0)
     rating = models.FloatField(default=0.0)
     latitude = models.FloatField()
     longitude = models.FloatField()
     flags = models.IntegerField(default=0)
-    timestamp = models.DateTimeField(auto_now_add=True)
+    timestamp = models.DateTimeField(auto_now_add=True, db_index=True)
+    modified = models.DateTimeField(auto_now=True, db_index=True)
     status = models.IntegerField(choices=ItemStatusChoices.get(), default=ItemStatusChoices.UNVERIFIED)
 
+    objects = VisibleItemManager()
+    # Moderator manager, sees the deleted and removed items as well
+    all_objects = models.Manager()
+
+    class Meta:
+        index_together = [['flags', 'timestamp'], ['status', 'timestamp']]
+
     def recalculate_rating(self):
         self.rating = 0.0
         weight = 0.0
@@ -77,15 +148,89 @@ class Rating(models.Model):
         unique_together = [['item', 'author']]
 
 
+class RatingHistogram(models.Model):
+    """
+    Number of ratings of an item per star (ratings rounded half up) and their exact sum, maintained by add_rating.
+    The statistics are computed from the six buckets without reading the ratings.
+    """
+
+    STARS = range(6)
+
+    item = models.OneToOneField(Item, primary_key=True, related_name='rating_histogram')
+    bucket_0 = models.IntegerField(default=0)
+    bucket_1 = models.IntegerField(default=0)
+    bucket_2 = models.IntegerField(default=0)
+    bucket_3 = models.IntegerField(default=0)
+    bucket_4 = models.IntegerField(default=0)
+    bucket_5 = models.IntegerField(default=0)
+    total = models.FloatField(default=0.0)
+
+    @classmethod
+    def get_field(cls, rating):
+        return 'bucket_%d' % min(max(int(math.floor(rating + 0.5)), cls.STARS[0]), cls.STARS[-1])
+
+    @classmethod
+    def get_aggregates(cls):
+        """
+        Aggregates of a Rating queryset computing the buckets of get_field and the total
+        """
+
+        aggregates = {'total': Sum('rating')}
+        for star in cls.STARS:
+            conditions = {}
+            if star != cls.STARS[0]:
+                conditions['rating__gte'] = star - 0.5
+            if star != cls.STARS[-1]:
+                conditions['rating__lt'] = star + 0.5
+            aggregates['bucket_%d' % star] = Sum(Case(When(then=1, **conditions), default=0,
+                                                      output_field=models.IntegerField()))
+        return aggregates
+
+    def get_counts(self):
+        return [getattr(self, 'bucket_%d' % star) for star in self.STARS]
+
+    def get_percentile(self, fraction):
+        """
+        Star of the rating at `fraction` of the sorted ratings (nearest rank), None without ratings
+        """
+
+        counts = self.get_counts()
+        rank = max(1, int(math.ceil(fraction * sum(counts))))
+        cumulative = 0
+        for star, count in zip(self.STARS, counts):
+            cumulative += count
+            if cumulative >= rank:
+                return star
+        return None
+
+    def get_statistics(self):
+        counts = self.get_counts()
+        count = sum(counts)
+        return {
+            'count': count,
+            'counts': counts,
+            'mean': self.total / count if count else None,
+            'median': self.get_percentile(0.5),
+            'percentiles': {str(percent): self.get_percentile(percent / 100.0) for percent in (10, 25, 75, 90)},
+        }
+
+
 class Reactable(models.Model):
     BASE_SCORE = 10.0
+    SCORES = (1, 2, 4, 8, 16)
+    UPVOTE_THRESHOLDS = (1, 10, 50, 200, 1000)
+    DOWNVOTE_THRESHOLDS = (0, 5, 10, 20, 50)
+    FLAG_THRESHOLDS = (0, 4, 8, 16, 32)
 
     upvotes = models.IntegerField(default=0)
     downvotes = models.IntegerField(default=0)
     flags = models.IntegerField(default=0)
-    timestamp = models.DateTimeField(auto_now_add=True)
+    timestamp = models.DateTimeField(auto_now_add=True, db_index=True)
     experience = models.FloatField(default=0)
 
+    class Meta:
+        index_together = [['flags', 'timestamp']]
+
     @staticmethod
     def convert_to_score(count, scale, values=(1, 10, 50, 200, 1000), scores=(1, 2, 4, 8, 16)):
         for index in reversed(range(len(values))):
@@ -95,9 +240,9 @@ class Reactable(models.Model):
         return 0.0
 
     def recalculate_score(self):
-        return self.BASE_SCORE - self.convert_to_score(self.flags, 50, values=(0, 4, 8, 16, 32)) \
-               - self.convert_to_score(self.downvotes, 20, values=(0, 5, 10, 20, 50)) \
-               + self.convert_to_score(self.upvotes, 10)
+        return self.BASE_SCORE - self.convert_to_score(self.flags, 50, self.FLAG_THRESHOLDS, self.SCORES) \
+               - self.convert_to_score(self.downvotes, 20, self.DOWNVOTE_THRESHOLDS, self.SCORES) \
+               + self.convert_to_score(self.upvotes, 10, self.UPVOTE_THRESHOLDS, self.SCORES)
 
     def recalculate_votes(self):
         self.upvotes = Reaction.objects.filter(reactable=self, reaction=ReactionChoices.UPVOTE).count()
@@ -109,12 +254,28 @@ class Reaction(models.Model):
     reaction = models.IntegerField(choices=ReactionChoices.get(), default=ReactionChoices.NONE)
     reactable = models.ForeignKey(Reactable, related_name='reactions')
     author = models.ForeignKey(UserProfile)
+    timestamp = models.DateTimeField(auto_now_add=True, db_index=True)
+
+    class Meta:
+        index_together = [['reaction', 'timestamp']]
+
+
+class PendingReaction(models.Model):
+    """
+    Append-only buffer of the reactions received in write-behind mode, applied in batches by flush_reactions
+    """
+
+    reactable = models.ForeignKey(Reactable, related_name='pending_reactions')
+    author = models.ForeignKey(UserProfile)
+    action = models.CharField(max_length=8, choices=ReactionActions.get())
     timestamp = models.DateTimeField(auto_now_add=True)
 
 
 class Comment(Reactable):
     item = models.ForeignKey(Item, related_name='comments')
     author = models.ForeignKey(UserProfile)
+    author_name = models.CharField(max_length=150, blank=True, default='')
+    author_tier = models.SmallIntegerField(default=0)
     description = models.TextField()
 
     class Meta:
@@ -122,16 +283,72 @@ class Comment(Reactable):
 
     def recalculate_score(self):
         score = super().recalculate_score()
-        self.author.reputation += (score - self.experience)
+        # Incremented in the database, concurrent score changes of the author's other content are not lost
+        UserProfile.objects.filter(pk=self.author_id).update(reputation=F('reputation') + (score - self.experience))
         self.experience = score
 
 
 class Photo(Reactable):
     item = models.ForeignKey(Item, related_name='photos')
     author = models.ForeignKey(UserProfile)
+    author_name = models.CharField(max_length=150, blank=True, default='')
+    author_tier = models.SmallIntegerField(default=0)
     picture = models.ImageField()
 
     def recalculate_score(self):
         score = super().recalculate_score()
-        self.author.reputation += (score - self.experience)
-        self.experience = score
\ No newline at end of file
+        # Incremented in the database, concurrent score changes of the author's other content are not lost
+        UserProfile.objects.filter(pk=self.author_id).update(reputation=F('reputation') + (score - self.experience))
+        self.experience = score
+
+
+class ActivityEntry(models.Model):
+    """
+    Entry of the activity feed of `owner`, written when they contribute or when someone reacts to their content.
+    The feed is read newest first by id, a range scan of the (owner, id) index.
+    """
+
+    owner = models.ForeignKey(UserProfile, related_name='activity')
+    actor = models.ForeignKey(UserProfile, related_name='+')
+    verb = models.CharField(max_length=8, choices=ActivityVerbs.get())
+    item = models.ForeignKey(Item, related_name='+')
+    reactable = models.ForeignKey(Reactable, null=True, blank=True, related_name='+')
+    value = models.FloatField(null=True, blank=True)
+    timestamp = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        index_together = [['owner', 'id']]
+
+
+class StoredFile(models.Model):
+    """
+    Content addressed file shared by every photo with the same content
+    """
+
+    digest = models.CharField(max_length=64, unique=True)
+    name = models.CharField(max_length=256, unique=True)
+    size = models.BigIntegerField()
+    references = models.IntegerField(default=0)
+    created = models.DateTimeField(auto_now_add=True)
+
+
+class PhotoUpload(models.Model):
+    """
+    Resumable upload of a photo, the chunks are appended to a part file until the upload is finalized
+    """
+
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    item = models.ForeignKey(Item, related_name='photo_uploads')
+    author = models.ForeignKey(UserProfile)
+    file_name = models.CharField(max_length=256)
+    size = models.BigIntegerField()
+    offset = models.BigIntegerField(default=0)
+    created = models.DateTimeField(auto_now_add=True)
+    photo = models.OneToOneField(Photo, null=True, blank=True)
+
+    def get_path(self):
+        return os.path.join(settings.MEDIA_ROOT, 'uploads', '%s.part' % self.id)
+
+    def is_expired(self):
+        return not self.photo_id and \
+            self.created < timezone.now() - timedelta(seconds=Configurations.PHOTO_UPLOAD_TTL)
@@ -0,0 +1,311 @@
+"""
+Offline region packs, one SQLite database per tile holding its visible items with their comments and photo
+thumbnails, and an R*Tree index over the item locations.
+
+Packs are written row batch by row batch while the content is hashed, the hash is the version of the pack and part
+of its file name. The version of every tile is trusted for Configurations.REGION_PACK_CACHE_TIMEOUT seconds, after
+which the tile is streamed again and the existing file is reused when the content did not change.
+
+The API never builds packs, it queues the missing and outdated tiles in the cache and the build_region_packs command
+run with --requested builds them.
+"""
+
+import hashlib
+import io
+import math
+import os
+import re
+import sqlite3
+import tempfile
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.http import FileResponse, HttpResponse, StreamingHttpResponse
+from django.utils.http import http_date
+from PIL import Image
+
+from account.models import UserProfile
+from item.models import Item, Comment, Photo
+from project_hermes.hermes_config import Configurations
+from project_hermes.metrics import timed, record_cache
+
+PACK_FORMAT = 1
+PACK_DIRECTORY = 'packs'
+THUMBNAIL_DIRECTORY = 'thumbnails'
+BATCH_SIZE = 500
+READ_BUFFER_SIZE = 64 * 1024
+REQUESTS_KEY = 'region_pack:requests'
+
+SCHEMA = [
+    'CREATE TABLE meta (key TEXT PRIMARY KEY, value TEXT)',
+    'CREATE TABLE items (id INTEGER PRIMARY KEY, title TEXT, description TEXT, author INTEGER, rating REAL, '
+    'latitude REAL, longitude REAL, flags INTEGER, status INTEGER, timestamp TEXT, modified TEXT)',
+    'CREATE TABLE comments (id INTEGER PRIMARY KEY, item INTEGER, author INTEGER, description TEXT, '
+    'upvotes INTEGER, downvotes INTEGER, flags INTEGER, timestamp TEXT)',
+    'CREATE TABLE photos (id INTEGER PRIMARY KEY, item INTEGER, author INTEGER, picture TEXT, '
+    'upvotes INTEGER, downvotes INTEGER, flags INTEGER, timestamp TEXT, thumbnail BLOB)',
+    'CREATE TABLE authors (id INTEGER PRIMARY KEY, username TEXT)',
+    'CREATE INDEX comments_item ON comments (item)',
+    'CREATE INDEX photos_item ON photos (item)',
+]
+
+
+def get_directory():
+    return os.path.join(settings.MEDIA_ROOT, PACK_DIRECTORY)
+
+
+def get_tiles(min_latitude, max_latitude, min_longitude, max_longitude):
+    size = Configurations.REGION_PACK_TILE_SIZE
+    return [(row, column)
+            for row in range(math.floor(min_latitude / size), math.floor(max_latitude / size) + 1)
+            for column in range(math.floor(min_longitude / size), math.floor(max_longitude / size) + 1)]
+
+
+def get_thumbnail(picture):
+    """
+    JPEG thumbnail of the photo, stored next to the packs under the hash of the picture name. Pictures are content
+    addressed, a name always designates the same content.
+    """
+
+    size = Configurations.REGION_PACK_THUMBNAIL_SIZE
+    digest = hashlib.sha1(('%s:%d' % (picture.name, size)).encode('utf-8')).hexdigest()
+    path = os.path.join(get_directory(), THUMBNAIL_DIRECTORY, digest + '.jpg')
+    try:
+        with open(path, 'rb') as thumbnail_file:
+            return thumbnail_file.read()
+    except FileNotFoundError:
+        pass
+
+    try:
+        with Image.open(os.path.join(settings.MEDIA_ROOT, picture.name)) as image:
+            image.thumbnail((size, size))
+            output = io.BytesIO()
+            image.convert('RGB').save(output, 'JPEG', quality=70)
+    except (OSError, ValueError):
+        return None
+
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path + '.tmp', 'wb') as thumbnail_file:
+        thumbnail_file.write(output.getvalue())
+    os.replace(path + '.tmp', path)
+    return output.getvalue()
+
+
+def stream_rows(database, hasher, table, rows):
+    """
+    Inserts the rows in batches, feeding them to the version hash
+    """
+
+    batch = []
+    count = 0
+    for row in rows:
+        hasher.update(repr(row).encode('utf-8'))
+        batch.append(row)
+        if len(batch) == BATCH_SIZE:
+            database.executemany('INSERT INTO %s VALUES (%s)' % (table, ','.join('?' * len(row))), batch)
+            count += len(batch)
+            batch = []
+    if batch:
+        database.executemany('INSERT INTO %s VALUES (%s)' % (table, ','.join('?' * len(batch[0]))), batch)
+        count += len(batch)
+    return count
+
+
+def create_spatial_index(database):
+    try:
+        database.execute('CREATE VIRTUAL TABLE item_index USING rtree(id, min_latitude, max_latitude, '
+                         'min_longitude, max_longitude)')
+    except sqlite3.OperationalError:
+        # SQLite built without the R*Tree module, readers fall back to the B-tree index
+        database.execute('CREATE INDEX item_location ON items (latitude, longitude)')
+        return 'btree'
+
+    database.execute('INSERT INTO item_index SELECT id, latitude, latitude, longitude, longitude FROM items')
+    return 'rtree'
+
+
+@timed('build_region_pack')
+def build_region_pack(row, column):
+    """
+    Streams the tile into a new pack and returns its (version, file name, size). The file of an unchanged tile is
+    kept as is.
+    """
+
+    size = Configurations.REGION_PACK_TILE_SIZE
+    items = Item.objects.filter(latitude__gte=row * size, latitude__lt=(row + 1) * size,
+                                longitude__gte=column * size, longitude__lt=(column + 1) * size)
+    item_ids = items.values('id')
+
+    directory = get_directory()
+    os.makedirs(directory, exist_ok=True)
+    temporary_file = tempfile.NamedTemporaryFile(dir=directory, suffix='.tmp', delete=False)
+    temporary_file.close()
+
+    hasher = hashlib.sha256(('%d:%d:%d:%r' % (PACK_FORMAT, row, column, size)).encode('utf-8'))
+    database = sqlite3.connect(temporary_file.name)
+    try:
+        for statement in SCHEMA:
+            database.execute(statement)
+
+        counts = {}
+        counts['items'] = stream_rows(database, hasher, 'items', (
+            (item.id, item.title, item.description, item.author_id, item.rating, item.latitude, item.longitude,
+             item.flags, item.status, item.timestamp.isoformat(), item.modified.isoformat())
+            for item in items.order_by('id').iterator()
+        ))
+        counts['comments'] = stream_rows(database, hasher, 'comments', (
+            (comment.id, comment.item_id, comment.author_id, comment.description, comment.upvotes,
+             comment.downvotes, comment.flags, comment.timestamp.isoformat())
+            for comment in Comment.objects.filter(item__in=item_ids).order_by('id').iterator()
+        ))
+        counts['photos'] = stream_rows(database, hasher, 'photos', (
+            (photo.id, photo.item_id, photo.author_id, photo.picture.name, photo.upvotes, photo.downvotes,
+             photo.flags, photo.timestamp.isoformat(), get_thumbnail(photo.picture))
+            for photo in Photo.objects.filter(item__in=item_ids).order_by('id').iterator()
+        ))
+
+        author_ids = set()
+        for table in ('items', 'comments', 'photos'):
+            author_ids.update(author_id for author_id, in database.execute('SELECT DISTINCT author FROM ' + table))
+        authors = UserProfile.objects.filter(pk__in=author_ids)
+        stream_rows(database, hasher, 'authors', (
+            (author.id, author.user.username)
+            for author in authors.select_related('user').order_by('id').iterator()
+        ))
+
+        version = hasher.hexdigest()[:16]
+        spatial_index = create_spatial_index(database)
+        database.executemany('INSERT INTO meta VALUES (?, ?)', [
+            ('format', str(PACK_FORMAT)),
+            ('version', version),
+            ('tile', '%d:%d' % (row, column)),
+            ('bounding_box', '%r,%r,%r,%r' % (row * size, (row + 1) * size, column * size, (column + 1) * size)),
+            ('spatial_index', spatial_index),
+        ] + [(table + '_count', str(count)) for table, count in counts.items()])
+        database.commit()
+        database.execute('VACUUM')
+    except BaseException:
+        database.close()
+        os.remove(temporary_file.name)
+        raise
+    database.close()
+
+    name = 'tile_%d_%d_%s.sqlite' % (row, column, version)
+    path = os.path.join(directory, name)
+    if os.path.exists(path):
+        os.remove(temporary_file.name)
+    else:
+        os.replace(temporary_file.name, path)
+    return version, name, os.path.getsize(path)
+
+
+def get_region_pack(row, column, rebuild=False, build=True):
+    """
+    Returns the (version, file name, size) of the pack of the tile, built when missing or outdated. Without build
+    the tile is queued for build_region_packs instead, and the outdated pack or None is returned meanwhile.
+    """
+
+    key = 'region_pack:%d:%d:%r' % (row, column, Configurations.REGION_PACK_TILE_SIZE)
+    cached = None if rebuild else cache.get(key)
+    if cached is not None and not os.path.exists(os.path.join(get_directory(), cached[0][1])):
+        cached = None
+    fresh = cached is not None and time.time() - cached[1] < Configurations.REGION_PACK_CACHE_TIMEOUT
+    record_cache('region_pack', fresh)
+
+    if fresh:
+        return cached[0]
+    if not build:
+        request_region_pack(row, column)
+        return cached[0] if cached else None
+
+    pack = build_region_pack(row, column)
+    # Kept past the timeout, so an outdated pack can still be handed out while the tile is rebuilt
+    cache.set(key, (pack, time.time()), None)
+    return pack
+
+
+def request_region_pack(row, column):
+    """
+    Queues the tile for build_region_packs --requested. The queue is a set in the cache updated without a lock, a
+    request lost to a race is made again by the next poll of the client.
+    """
+
+    requested = cache.get(REQUESTS_KEY) or set()
+    if (row, column) not in requested:
+        requested.add((row, column))
+        cache.set(REQUESTS_KEY, requested, None)
+
+
+def take_requested_region_packs():
+    requested = cache.get(REQUESTS_KEY) or set()
+    cache.delete(REQUESTS_KEY)
+    return sorted(requested)
+
+
+def prune_region_packs(current_names):
+    """
+    Deletes the pack files which are not the current version of their tile
+    """
+
+    removed = []
+    for name in os.listdir(get_directory()):
+        if name.startswith('tile_') and name not in current_names:
+            os.remove(os.path.join(get_directory(), name))
+            removed.append(name)
+    return removed
+
+
+def serve_region_pack(request, name):
+    """
+    Serves a pack with single range support, so an interrupted download can be resumed. The name contains the
+    version, the content behind it never changes.
+    """
+
+    if not re.match(r'^tile_-?\d+_-?\d+_[0-9a-f]+\.sqlite$', name):
+        return HttpResponse(status=404)
+    path = os.path.join(get_directory(), name)
+    try:
+        stat = os.stat(path)
+    except FileNotFoundError:
+        return HttpResponse(status=404)
+
+    etag = '"%s"' % name
+    requested_range = request.META.get('HTTP_RANGE', '')
+    if_range = request.META.get('HTTP_IF_RANGE')
+    match = re.match(r'^bytes=(\d*)-(\d*)$', requested_range.strip())
+    if match and match.groups() != ('', '') and if_range in (None, etag):
+        start, end = match.groups()
+        if start:
+            start, end = int(start), min(int(end) if end else stat.st_size - 1, stat.st_size - 1)
+        else:
+            start, end = max(0, stat.st_size - int(end)), stat.st_size - 1
+        if start > end:
+            response = HttpResponse(status=416)
+            response['Content-Range'] = 'bytes */%d' % stat.st_size
+            return response
+
+        def read_range():
+            with open(path, 'rb') as pack_file:
+                pack_file.seek(start)
+                remaining = end - start + 1
+                while remaining > 0:
+                    chunk = pack_file.read(min(READ_BUFFER_SIZE, remaining))
+                    if not chunk:
+                        break
+                    remaining -= len(chunk)
+                    yield chunk
+
+        response = StreamingHttpResponse(read_range(), status=206, content_type='application/x-sqlite3')
+        response['Content-Range'] = 'bytes %d-%d/%d' % (start, end, stat.st_size)
+        response['Content-Length'] = str(end - start + 1)
+    else:
+        response = FileResponse(open(path, 'rb'), content_type='application/x-sqlite3')
+        response['Content-Length'] = str(stat.st_size)
+
+    response['Accept-Ranges'] = 'bytes'
+    response['ETag'] = etag
+    response['Last-Modified'] = http_date(stat.st_mtime)
+    response['Cache-Control'] = 'public, max-age=31536000, immutable'
+    response['Content-Disposition'] = 'attachment; filename="%s"' % name
+    return response
@@ -1,7 +1,7 @@
 from rest_framework import serializers
 
 from account.serializers import UserProfileSerializer
-from item.models import Item, Comment, Photo, Rating
+from item.models import Item, Comment, Photo, Rating, PhotoUpload, ActivityEntry, RatingHistogram
 
 
 class ItemSerializer(serializers.ModelSerializer):
@@ -11,6 +11,14 @@ class ItemSerializer(serializers.ModelSerializer):
         model = Item
 
 
+class ItemDetailSerializer(ItemSerializer):
+    rating_histogram = serializers.SerializerMethodField()
+
+    def get_rating_histogram(self, item):
+        histogram = RatingHistogram.objects.filter(item=item).first() or RatingHistogram(item=item)
+        return histogram.get_statistics()
+
+
 class CommentSerializer(serializers.ModelSerializer):
     author = UserProfileSerializer()
 
@@ -25,6 +33,43 @@ class PhotoSerializer(serializers.ModelSerializer):
         model = Photo
 
 
+class ItemSummarySerializer(serializers.ModelSerializer):
+    """
+    Author rendered from the author_name and author_tier snapshot, the profile is not read
+    """
+
+    class Meta:
+        model = Item
+
+
+class CommentSummarySerializer(serializers.ModelSerializer):
+    class Meta:
+        model = Comment
+
+
+class PhotoSummarySerializer(serializers.ModelSerializer):
+    class Meta:
+        model = Photo
+
+
+AUTHOR_SUMMARY = 'summary'
+AUTHOR_SUMMARY_SERIALIZERS = {
+    ItemSerializer: ItemSummarySerializer,
+    CommentSerializer: CommentSummarySerializer,
+    PhotoSerializer: PhotoSummarySerializer,
+}
+
+
+def get_author_serializer(request, serializer_class):
+    """
+    Summary variant of the serializer when the request asks for `?author=summary`
+    """
+
+    if request.query_params.get('author') == AUTHOR_SUMMARY:
+        return AUTHOR_SUMMARY_SERIALIZERS.get(serializer_class, serializer_class)
+    return serializer_class
+
+
 class RatingSerializer(serializers.ModelSerializer):
     author = UserProfileSerializer()
 
@@ -32,6 +77,12 @@ class RatingSerializer(serializers.ModelSerializer):
         model = Rating
 
 
+class PhotoUploadSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = PhotoUpload
+        fields = ['id', 'item', 'file_name', 'size', 'offset', 'created', 'photo']
+
+
 class CreateItemSerializer(serializers.Serializer):
     title = serializers.CharField()
     description = serializers.CharField()
@@ -56,6 +107,16 @@ class AddPhotoSerializer(serializers.Serializer):
     picture = serializers.ImageField()
 
 
+class StartPhotoUploadSerializer(serializers.Serializer):
+    file_name = serializers.CharField(max_length=256)
+    size = serializers.IntegerField(min_value=1)
+
+
+class ModerationActionSerializer(serializers.Serializer):
+    type = serializers.ChoiceField(choices=['item', 'comment', 'photo'])
+    ids = serializers.ListField(child=serializers.IntegerField())
+
+
 class BoundingBoxSerializer(serializers.Serializer):
     min_latitude = serializers.FloatField()
     max_latitude = serializers.FloatField()
@@ -65,3 +126,15 @@ class BoundingBoxSerializer(serializers.Serializer):
     def validate_values(self):
         return self.min_latitude <= self.max_latitude and self.min_longitude <= self.max_longitude
 
+
+class HeatmapSerializer(BoundingBoxSerializer):
+    rows = serializers.IntegerField(min_value=1)
+    columns = serializers.IntegerField(min_value=1)
+
+
+class ActivityEntrySerializer(serializers.ModelSerializer):
+    actor_name = serializers.CharField(source='actor.user.username')
+
+    class Meta:
+        model = ActivityEntry
+        fields = ['id', 'verb', 'actor', 'actor_name', 'item', 'reactable', 'value', 'timestamp']
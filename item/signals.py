@@ -0,0 +1,56 @@
+from django.db.models.signals import post_delete, post_init, post_save, pre_save
+from django.dispatch import receiver
+
+from account.models import UserProfile
+from item.batch import invalidate_batch_cache
+from item.events import broker, EventTypes
+from item.models import Item, Comment, Photo
+from item.storage import release_content_addressed
+
+
+def publish_item(item, event_type):
+    from item.serializers import ItemSerializer
+
+    broker.publish(event_type, item.latitude, item.longitude, lambda: ItemSerializer(item).data)
+
+
+@receiver(post_init, sender=Item)
+def remember_status(sender, instance, **kwargs):
+    instance._initial_status = instance.status
+
+
+@receiver(post_save, sender=Item)
+def publish_item_event(sender, instance, created, **kwargs):
+    if created:
+        event_type = EventTypes.CREATED
+    elif instance.status != instance._initial_status:
+        event_type = EventTypes.STATUS
+    else:
+        event_type = EventTypes.UPDATED
+
+    instance._initial_status = instance.status
+    publish_item(instance, event_type)
+
+
+@receiver(post_delete, sender=Photo)
+def release_picture(sender, instance, **kwargs):
+    release_content_addressed(instance.picture.name)
+
+
+@receiver(post_save, sender=Item)
+@receiver(post_save, sender=Comment)
+@receiver(post_save, sender=Photo)
+@receiver(post_delete, sender=Item)
+@receiver(post_delete, sender=Comment)
+@receiver(post_delete, sender=Photo)
+def invalidate_batch_entry(sender, instance, **kwargs):
+    invalidate_batch_cache(sender, [instance.pk])
+
+
+@receiver(pre_save, sender=Item)
+@receiver(pre_save, sender=Comment)
+@receiver(pre_save, sender=Photo)
+def fill_author_summary(sender, instance, **kwargs):
+    if instance._state.adding and not instance.author_name:
+        instance.author_name = instance.author.get_display_name()
+        instance.author_tier = UserProfile.get_tier(instance.author.reputation)
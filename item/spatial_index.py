@@ -0,0 +1,280 @@
+"""
+In-process spatial index of the visible items, used to answer bounding box searches without scanning the item table
+"""
+
+import sys
+import threading
+import time
+from array import array
+from datetime import timedelta
+
+from django.db import DEFAULT_DB_ALIAS
+from django.utils import timezone
+
+from item.models import Item, ItemStatusChoices
+from project_hermes.hermes_config import Configurations
+from project_hermes.metrics import registry, timed
+
+
+class QuadTree:
+    """
+    Region quadtree over (latitude, longitude) whose nodes are stored in flat arrays.
+    Leaves hold buckets of slot numbers, the point coordinates themselves live in the owning index.
+    """
+
+    def __init__(self, latitudes, longitudes, bucket_size=64, max_depth=18):
+        self.latitudes = latitudes
+        self.longitudes = longitudes
+        self.bucket_size = bucket_size
+        self.max_depth = max_depth
+
+        self.min_latitude = array('d')
+        self.max_latitude = array('d')
+        self.min_longitude = array('d')
+        self.max_longitude = array('d')
+        self.depth = array('b')
+        self.first_child = array('l')
+        self.buckets = []
+
+        self._add_node(-90.0, 90.0, -180.0, 180.0, 0)
+
+    def _add_node(self, min_latitude, max_latitude, min_longitude, max_longitude, depth):
+        self.min_latitude.append(min_latitude)
+        self.max_latitude.append(max_latitude)
+        self.min_longitude.append(min_longitude)
+        self.max_longitude.append(max_longitude)
+        self.depth.append(depth)
+        self.first_child.append(-1)
+        self.buckets.append(array('l'))
+        return len(self.depth) - 1
+
+    def _child_for(self, node, latitude, longitude):
+        mid_latitude = (self.min_latitude[node] + self.max_latitude[node]) / 2.0
+        mid_longitude = (self.min_longitude[node] + self.max_longitude[node]) / 2.0
+        quadrant = (2 if latitude >= mid_latitude else 0) + (1 if longitude >= mid_longitude else 0)
+        return self.first_child[node] + quadrant
+
+    def _leaf_for(self, latitude, longitude):
+        node = 0
+        while self.first_child[node] != -1:
+            node = self._child_for(node, latitude, longitude)
+        return node
+
+    def _split(self, node):
+        min_latitude, max_latitude = self.min_latitude[node], self.max_latitude[node]
+        min_longitude, max_longitude = self.min_longitude[node], self.max_longitude[node]
+        mid_latitude = (min_latitude + max_latitude) / 2.0
+        mid_longitude = (min_longitude + max_longitude) / 2.0
+        depth = self.depth[node] + 1
+
+        first = self._add_node(min_latitude, mid_latitude, min_longitude, mid_longitude, depth)
+        self._add_node(min_latitude, mid_latitude, mid_longitude, max_longitude, depth)
+        self._add_node(mid_latitude, max_latitude, min_longitude, mid_longitude, depth)
+        self._add_node(mid_latitude, max_latitude, mid_longitude, max_longitude, depth)
+        self.first_child[node] = first
+
+        bucket = self.buckets[node]
+        self.buckets[node] = array('l')
+        for slot in bucket:
+            self.buckets[self._child_for(node, self.latitudes[slot], self.longitudes[slot])].append(slot)
+
+    def insert(self, slot):
+        latitude, longitude = self.latitudes[slot], self.longitudes[slot]
+        node = self._leaf_for(latitude, longitude)
+        self.buckets[node].append(slot)
+
+        if len(self.buckets[node]) > self.bucket_size and self.depth[node] < self.max_depth:
+            self._split(node)
+
+    def remove(self, slot):
+        bucket = self.buckets[self._leaf_for(self.latitudes[slot], self.longitudes[slot])]
+        bucket.remove(slot)
+
+    def search(self, min_latitude, max_latitude, min_longitude, max_longitude):
+        """
+        Returns the slots of all the points inside the (inclusive) bounding box
+        """
+
+        slots = []
+        stack = [0]
+        while stack:
+            node = stack.pop()
+            if self.min_latitude[node] > max_latitude or self.max_latitude[node] < min_latitude or \
+                    self.min_longitude[node] > max_longitude or self.max_longitude[node] < min_longitude:
+                continue
+
+            if self.first_child[node] != -1:
+                first = self.first_child[node]
+                stack.extend((first, first + 1, first + 2, first + 3))
+                continue
+
+            if min_latitude <= self.min_latitude[node] and self.max_latitude[node] <= max_latitude and \
+                    min_longitude <= self.min_longitude[node] and self.max_longitude[node] <= max_longitude:
+                slots.extend(self.buckets[node])
+                continue
+
+            for slot in self.buckets[node]:
+                if min_latitude <= self.latitudes[slot] <= max_latitude and \
+                        min_longitude <= self.longitudes[slot] <= max_longitude:
+                    slots.append(slot)
+        return slots
+
+    def memory_footprint(self):
+        size = sum(values.buffer_info()[1] * values.itemsize for values in
+                   (self.min_latitude, self.max_latitude, self.min_longitude, self.max_longitude, self.depth,
+                    self.first_child))
+        size += sys.getsizeof(self.buckets)
+        size += sum(sys.getsizeof(bucket) for bucket in self.buckets)
+        return size
+
+
+class SpatialIndex:
+    """
+    Compact column store of (id, latitude, longitude, rating, status) for the visible items with a quadtree on top.
+    The index is refreshed incrementally from the `Item.modified` column, so only rows changed since the last
+    refresh are read back from the database.
+    """
+
+    # Rows saved while a refresh is running may carry a slightly older `modified`, so refreshes overlap a little
+    REFRESH_OVERLAP = timedelta(seconds=2)
+
+    def __init__(self):
+        self.ids = array('q')
+        self.latitudes = array('d')
+        self.longitudes = array('d')
+        self.ratings = array('d')
+        self.statuses = array('b')
+        self.slots = {}
+        self.free_slots = []
+        self.tree = QuadTree(self.latitudes, self.longitudes)
+
+        self.lock = threading.RLock()
+        self.watermark = None
+        self.last_refresh = None
+        self.last_refresh_duration = 0.0
+
+    def __len__(self):
+        return len(self.slots)
+
+    def discard(self, item_id):
+        slot = self.slots.pop(item_id, None)
+        if slot is None:
+            return
+
+        self.tree.remove(slot)
+        self.ids[slot] = -1
+        self.free_slots.append(slot)
+
+    def upsert(self, item_id, latitude, longitude, rating, status):
+        self.discard(item_id)
+        if status not in ItemStatusChoices.visible():
+            return
+
+        if self.free_slots:
+            slot = self.free_slots.pop()
+            self.ids[slot] = item_id
+            self.latitudes[slot] = latitude
+            self.longitudes[slot] = longitude
+            self.ratings[slot] = rating
+            self.statuses[slot] = status
+        else:
+            slot = len(self.ids)
+            self.ids.append(item_id)
+            self.latitudes.append(latitude)
+            self.longitudes.append(longitude)
+            self.ratings.append(rating)
+            self.statuses.append(status)
+
+        self.slots[item_id] = slot
+        self.tree.insert(slot)
+
+    @timed('spatial_index_refresh')
+    def refresh(self):
+        """
+        Applies every item changed since the previous refresh, the first call loads the whole table
+        """
+
+        with self.lock:
+            start = time.monotonic()
+            now = timezone.now()
+
+            # Always read from the primary, the watermark is the clock of this server and a lagging replica would
+            # hide the rows changed before it for good
+            if self.watermark is not None:
+                # Items hidden since the last refresh have to be seen as well, to be dropped from the index
+                items = Item.all_objects.using(DEFAULT_DB_ALIAS) \
+                    .filter(modified__gte=self.watermark - self.REFRESH_OVERLAP)
+            else:
+                items = Item.objects.using(DEFAULT_DB_ALIAS).all()
+
+            rows = items.values_list('id', 'latitude', 'longitude', 'rating', 'status')
+            for item_id, latitude, longitude, rating, status in rows.iterator():
+                self.upsert(item_id, latitude, longitude, rating, status)
+
+            self.watermark = now
+            self.last_refresh = time.time()
+            self.last_refresh_duration = time.monotonic() - start
+
+    def refresh_if_stale(self):
+        if self.last_refresh is None or self.refresh_lag() >= Configurations.SPATIAL_INDEX_REFRESH_INTERVAL:
+            self.refresh()
+
+    def refresh_lag(self):
+        if self.last_refresh is None:
+            return float('inf')
+        return time.time() - self.last_refresh
+
+    def search(self, min_latitude, max_latitude, min_longitude, max_longitude):
+        """
+        Returns the ids of the visible items inside the bounding box
+        """
+
+        with self.lock:
+            slots = self.tree.search(min_latitude, max_latitude, min_longitude, max_longitude)
+            return [self.ids[slot] for slot in slots]
+
+    def memory_footprint(self):
+        with self.lock:
+            size = sum(values.buffer_info()[1] * values.itemsize for values in
+                       (self.ids, self.latitudes, self.longitudes, self.ratings, self.statuses))
+            size += sys.getsizeof(self.slots) + sys.getsizeof(self.free_slots)
+            return size + self.tree.memory_footprint()
+
+    def stats(self):
+        return {
+            'items': len(self),
+            'memory_footprint_bytes': self.memory_footprint(),
+            'refresh_lag_seconds': self.refresh_lag(),
+            'last_refresh_duration_seconds': self.last_refresh_duration,
+        }
+
+
+_index = None
+_index_lock = threading.Lock()
+
+registry.register_gauge('hermes_spatial_index_items', lambda: len(_index) if _index is not None else None)
+registry.register_gauge('hermes_spatial_index_memory_bytes',
+                        lambda: _index.memory_footprint() if _index is not None else None)
+registry.register_gauge('hermes_spatial_index_refresh_lag_seconds',
+                        lambda: _index.refresh_lag() if _index is not None else None)
+
+
+def get_spatial_index():
+    """
+    Returns the refreshed per-process index, or None when the index is disabled
+    """
+
+    global _index
+
+    if not Configurations.SPATIAL_INDEX_ENABLED:
+        return None
+
+    if _index is None:
+        with _index_lock:
+            if _index is None:
+                index = SpatialIndex()
+                index.refresh()
+                _index = index
+
+    _index.refresh_if_stale()
+    return _index
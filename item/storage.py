@@ -0,0 +1,82 @@
+"""
+Content addressed storage of the photos. Files are named after the SHA-256 of their content, identical uploads share
+one file, tracked by a StoredFile row counting the photos referencing it.
+"""
+
+import hashlib
+import os
+import tempfile
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F
+from django.views.static import serve
+
+from item.models import StoredFile
+
+CONTENT_ADDRESSED_DIRECTORY = 'cas'
+READ_BUFFER_SIZE = 64 * 1024
+
+
+def get_chunks(source):
+    if hasattr(source, 'chunks'):
+        source.seek(0)
+        for chunk in source.chunks(READ_BUFFER_SIZE):
+            yield chunk
+        return
+
+    for chunk in iter(lambda: source.read(READ_BUFFER_SIZE), b''):
+        yield chunk
+
+
+def store_content_addressed(source, original_name):
+    """
+    Streams the file into the storage while hashing it and returns the name to put in the FileField.
+    The reference count of the stored file is incremented, the caller is expected to save a row pointing to it in
+    the same transaction: the StoredFile row stays locked until the commit, so collect_photo_garbage never sees the
+    reference missing.
+    """
+
+    directory = os.path.join(settings.MEDIA_ROOT, CONTENT_ADDRESSED_DIRECTORY)
+    os.makedirs(directory, exist_ok=True)
+
+    hasher = hashlib.sha256()
+    size = 0
+    with tempfile.NamedTemporaryFile(dir=directory, suffix='.tmp', delete=False) as temporary_file:
+        for chunk in get_chunks(source):
+            hasher.update(chunk)
+            temporary_file.write(chunk)
+            size += len(chunk)
+    digest = hasher.hexdigest()
+
+    with transaction.atomic():
+        stored = StoredFile.objects.select_for_update().filter(digest=digest).first()
+        if not stored:
+            extension = os.path.splitext(original_name)[1].lower()[:8]
+            name = '%s/%s/%s/%s%s' % (CONTENT_ADDRESSED_DIRECTORY, digest[:2], digest[2:4], digest, extension)
+            stored, _ = StoredFile.objects.get_or_create(digest=digest, defaults={'name': name, 'size': size})
+            stored = StoredFile.objects.select_for_update().get(pk=stored.pk)
+
+        path = os.path.join(settings.MEDIA_ROOT, stored.name)
+        if os.path.exists(path):
+            os.remove(temporary_file.name)
+        else:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            os.replace(temporary_file.name, path)
+
+        StoredFile.objects.filter(pk=stored.pk).update(references=F('references') + 1)
+    return stored.name
+
+
+def release_content_addressed(name):
+    StoredFile.objects.filter(name=name).update(references=F('references') - 1)
+
+
+def serve_content_addressed(request, path, document_root=None):
+    """
+    The content behind a content addressed URL never changes, so it can be cached forever
+    """
+
+    response = serve(request, path, document_root=document_root)
+    response['Cache-Control'] = 'public, max-age=31536000, immutable'
+    return response
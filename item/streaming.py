@@ -0,0 +1,117 @@
+"""
+Streaming JSON responses for the large result sets.
+
+Rows are read in primary key batches, serialized one batch at a time and written out as a chunked JSON array,
+gzip compressed on the fly when the client accepts it. The memory held by the worker is bounded by one batch,
+whatever the size of the result.
+"""
+
+import json
+import re
+import zlib
+
+from django.http import StreamingHttpResponse
+from rest_framework.utils.encoders import JSONEncoder
+
+from project_hermes.hermes_config import Configurations
+
+QUALITY = re.compile(r'\bq\s*=\s*(\d+(?:\.\d*)?)')
+
+
+def wants_stream(request):
+    return request.query_params.get('stream') in ('1', 'true')
+
+
+def accepts_gzip(request):
+    """
+    Whether the Accept-Encoding of the request allows gzip, `gzip;q=0` refuses it and `*` stands for it when not
+    listed
+    """
+
+    qualities = {}
+    for coding in request.META.get('HTTP_ACCEPT_ENCODING', '').split(','):
+        name, _, parameters = coding.partition(';')
+        match = QUALITY.search(parameters)
+        qualities[name.strip().lower()] = float(match.group(1)) if match else 1.0
+    return qualities.get('gzip', qualities.get('x-gzip', qualities.get('*', 0.0))) > 0
+
+
+def iterate_batches(queryset, batch_size):
+    """
+    Keyset pagination on the primary key, each batch is one query and only one batch is in memory. The database
+    is fixed when called, in the view, since the batches are only read once the view returned and the replica
+    routing of the request is over.
+    """
+
+    queryset = queryset.using(queryset.db).order_by('pk')
+
+    def batches():
+        last_pk = None
+        while True:
+            batch_queryset = queryset.filter(pk__gt=last_pk) if last_pk is not None else queryset
+            batch = list(batch_queryset[:batch_size])
+            if not batch:
+                return
+            yield batch
+            if len(batch) < batch_size:
+                return
+            last_pk = batch[-1].pk
+
+    return batches()
+
+
+def iterate_ids(queryset, ids, batch_size):
+    """
+    Batches of the objects of `ids` in the order of `ids`, missing ones skipped. The database is fixed when called,
+    as in iterate_batches.
+    """
+
+    queryset = queryset.using(queryset.db)
+
+    def batches():
+        for offset in range(0, len(ids), batch_size):
+            chunk = ids[offset:offset + batch_size]
+            objects = queryset.in_bulk(chunk)
+            yield [objects[pk] for pk in chunk if pk in objects]
+
+    return batches()
+
+
+def render_json(batches, serializer_class, envelope):
+    encoder = JSONEncoder(ensure_ascii=False, separators=(',', ':'))
+    yield ('{%s:[' % json.dumps(envelope) if envelope else '[').encode('utf-8')
+
+    first = True
+    for batch in batches:
+        rows = ','.join(encoder.encode(row) for row in serializer_class(batch, many=True).data)
+        if rows:
+            yield (rows if first else ',' + rows).encode('utf-8')
+            first = False
+
+    yield (']}' if envelope else ']').encode('utf-8')
+
+
+def compress(chunks):
+    # wbits 31 writes the gzip header and trailer around the deflate stream
+    compressor = zlib.compressobj(Configurations.STREAM_COMPRESSION_LEVEL, zlib.DEFLATED, 31)
+    for chunk in chunks:
+        data = compressor.compress(chunk)
+        # Every batch is flushed so the client can parse it while the next one is read
+        data += compressor.flush(zlib.Z_SYNC_FLUSH)
+        if data:
+            yield data
+    yield compressor.flush()
+
+
+def stream_json_response(request, batches, serializer_class, envelope=None):
+    """
+    Streams the serialized batches as a JSON array, wrapped in {envelope: [...]} when given
+    """
+
+    chunks = render_json(batches, serializer_class, envelope)
+    gzipped = accepts_gzip(request)
+    response = StreamingHttpResponse(compress(chunks) if gzipped else chunks, content_type='application/json')
+    if gzipped:
+        response['Content-Encoding'] = 'gzip'
+    response['Vary'] = 'Accept-Encoding'
+    return response
@@ -1,3 +1,93 @@
-from django.test import TestCase
+import threading
+from unittest import mock, skipUnless
 
-# Create your tests here.
+from django.contrib.auth.models import User
+from django.db import connection
+from django.test import TransactionTestCase
+from rest_framework.test import APIClient
+
+from account.models import UserProfile
+from item.models import Item, Comment, Reactable, ItemStatusChoices
+from item.views import recalculate_reputations
+from project_hermes.hermes_config import Configurations
+
+UNTHROTTLED = {'write': (10 ** 6, 10 ** 6), 'reaction': (10 ** 6, 10 ** 6)}
+
+
+@skipUnless(connection.vendor == 'postgresql', 'SQLite serializes every write, the race needs row level locks')
+@mock.patch.object(Configurations, 'THROTTLE_BUDGETS', UNTHROTTLED)
+@mock.patch.object(Configurations, 'WRITE_BEHIND_REACTIONS', False)
+class ConcurrentWritesTest(TransactionTestCase):
+    """
+    Hammers one comment and one item from parallel threads, each with its own database connection, and checks
+    that no vote, rating or reputation change is lost
+    """
+
+    THREADS = 16
+    ROUNDS = 5
+
+    def setUp(self):
+        self.author = self.create_profile('author')
+        self.item = Item.objects.create(title='Contended', description='', author=self.author, latitude=12.9,
+                                        longitude=77.6, status=ItemStatusChoices.VERIFIED)
+        self.comment = Comment.objects.create(item=self.item, author=self.author, description='Contended')
+        self.voters = [self.create_profile('voter%d' % index) for index in range(self.THREADS)]
+
+    @staticmethod
+    def create_profile(username):
+        return UserProfile.objects.create(user=User.objects.create_user(username, username + '@example.com'))
+
+    def run_threads(self, target):
+        errors = []
+        barrier = threading.Barrier(self.THREADS)
+
+        def run(voter):
+            try:
+                client = APIClient()
+                client.force_authenticate(voter.user)
+                barrier.wait()
+                target(client, voter)
+            except Exception as error:  # pylint: disable=W0703
+                errors.append(error)
+            finally:
+                connection.close()
+
+        threads = [threading.Thread(target=run, args=(voter,)) for voter in self.voters]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(errors, [])
+
+    def test_parallel_votes(self):
+        def vote(client, voter):
+            for _ in range(self.ROUNDS):
+                for action in ('downvote', 'flag', 'unflag', 'upvote'):
+                    response = client.post('/api/comment/%d/%s/' % (self.comment.pk, action))
+                    assert response.status_code == 200, response.status_code
+
+        self.run_threads(vote)
+
+        comment = Comment.objects.get(pk=self.comment.pk)
+        self.assertEqual((comment.upvotes, comment.downvotes, comment.flags), (self.THREADS, 0, 0))
+        self.assertEqual(comment.experience, Reactable.recalculate_score(comment))
+
+        reputations = dict(UserProfile.objects.values_list('pk', 'reputation'))
+        recalculate_reputations(list(reputations))
+        self.assertEqual(reputations, dict(UserProfile.objects.values_list('pk', 'reputation')))
+        self.assertEqual(reputations[self.author.pk], comment.experience)
+        for voter in self.voters:
+            self.assertEqual(reputations[voter.pk], 1)
+
+    def test_parallel_ratings(self):
+        def rate(client, voter):
+            for rating in range(self.ROUNDS + 1):
+                response = client.post('/api/item/%d/add_rating/' % self.item.pk, {'rating': min(rating, 5)})
+                assert response.status_code == 200, response.status_code
+
+        self.run_threads(rate)
+
+        item = Item.objects.get(pk=self.item.pk)
+        self.assertEqual(item.rating, min(self.ROUNDS, 5))
+        self.assertEqual(UserProfile.objects.get(pk=self.author.pk).reputation,
+                         self.comment.experience + item.rating * 2)
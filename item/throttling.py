@@ -0,0 +1,109 @@
+"""
+Token bucket throttling of the write routes, per user and per IP
+"""
+
+import threading
+import time
+
+from django.core.cache import cache
+from rest_framework.throttling import BaseThrottle
+
+from project_hermes.hermes_config import Configurations
+
+
+class TokenBucketThrottle(BaseThrottle):
+    """
+    Every user and every IP gets a bucket of `capacity` tokens per scope, refilled at `rate` tokens a second,
+    see Configurations.THROTTLE_BUDGETS. A request takes a token from both its buckets, and from neither when one of
+    them is empty. The buckets live in the configured cache, the read-modify-write is not atomic so a burst of
+    parallel requests may overdraw a bucket slightly. Buckets fall back to process memory while the cache is
+    unreachable.
+    """
+
+    local_buckets = {}
+    local_lock = threading.Lock()
+
+    def __init__(self, scope):
+        self.scope = scope
+        self.wait_time = None
+
+    @staticmethod
+    def read_cache(keys, capacity, timeout, now):
+        """
+        Returns the buckets of `keys` from the cache, None when the cache is unreachable. The memcached backend
+        swallows the connection errors and a failed get looks like a miss, so a missing bucket is created with add,
+        which reports its failure, and read back when another request created it first.
+        """
+
+        try:
+            buckets = cache.get_many(keys)
+            for key in keys:
+                if key in buckets:
+                    continue
+                if cache.add(key, (capacity, now), timeout):
+                    buckets[key] = (capacity, now)
+                else:
+                    buckets[key] = cache.get(key)
+                    if buckets[key] is None:
+                        return None
+        except Exception:  # pylint: disable=W0703
+            return None
+        return buckets
+
+    @staticmethod
+    def take(buckets, capacity, rate, now):
+        """
+        Refills the buckets and takes a token out of each, returns (seconds to wait, None) when one of them is empty
+        and (None, buckets left) otherwise
+        """
+
+        tokens = {key: min(capacity, count + (now - timestamp) * rate) for key, (count, timestamp) in buckets.items()}
+        lowest = min(tokens.values())
+        if lowest < 1:
+            return (1 - lowest) / rate, None
+        return None, {key: (count - 1, now) for key, count in tokens.items()}
+
+    def allow_request(self, request, view):
+        capacity, rate = Configurations.THROTTLE_BUDGETS[self.scope]
+        # The bucket is full again after capacity / rate seconds, it does not need to outlive that
+        timeout = int(capacity / rate) + 1
+        now = time.time()
+
+        keys = ['throttle:%s:ip:%s' % (self.scope, self.get_ident(request))]
+        if request.user and request.user.is_authenticated():
+            keys.insert(0, 'throttle:%s:user:%d' % (self.scope, request.user.pk))
+
+        buckets = self.read_cache(keys, capacity, timeout, now)
+        if buckets is None:
+            with self.local_lock:
+                buckets = {key: self.local_buckets.get(key, (capacity, now)) for key in keys}
+                self.wait_time, buckets = self.take(buckets, capacity, rate, now)
+                if buckets:
+                    self.local_buckets.update(buckets)
+            return self.wait_time is None
+
+        self.wait_time, buckets = self.take(buckets, capacity, rate, now)
+        if buckets:
+            try:
+                cache.set_many(buckets, timeout)
+            except Exception:  # pylint: disable=W0703
+                pass
+        return self.wait_time is None
+
+    def wait(self):
+        return self.wait_time
+
+
+class ScopedThrottleMixin:
+    """
+    ViewSet mixin throttling the actions listed in `throttle_scopes` with the bucket of their scope
+    """
+
+    throttle_scopes = {}
+
+    def get_throttles(self):
+        throttles = super().get_throttles()
+        scope = self.throttle_scopes.get(self.action)
+        if scope:
+            throttles.append(TokenBucketThrottle(scope))
+        return throttles
@@ -0,0 +1,96 @@
+"""
+Resumable photo uploads: the chunks are streamed to a part file on disk and validated as they arrive,
+the Photo row is only created once the whole file is there
+"""
+
+import os
+
+from django.db import transaction
+from PIL import Image
+
+from item.models import Photo
+from item.storage import store_content_addressed
+from project_hermes.hermes_config import Configurations
+
+COPY_BUFFER_SIZE = 64 * 1024
+
+IMAGE_SIGNATURES = (b'\xff\xd8\xff', b'\x89PNG\r\n\x1a\n', b'GIF87a', b'GIF89a')
+
+
+class UploadError(Exception):
+    pass
+
+
+def is_image_header(header):
+    if header.startswith(b'RIFF') and header[8:12] == b'WEBP':
+        return True
+    return any(header.startswith(signature) for signature in IMAGE_SIGNATURES)
+
+
+def create_part_file(upload):
+    os.makedirs(os.path.dirname(upload.get_path()), exist_ok=True)
+    open(upload.get_path(), 'wb').close()
+
+
+def write_chunk(upload, offset, stream, length):
+    """
+    Copies `length` bytes of the stream to the part file at `offset` without holding the chunk in memory.
+    Returns the new offset of the upload.
+    """
+
+    if offset != upload.offset:
+        raise UploadError('Expected Offset %d' % upload.offset)
+    if length <= 0 or length > Configurations.MAX_PHOTO_CHUNK_SIZE:
+        raise UploadError('Incorrect Chunk Size')
+    if offset + length > upload.size:
+        raise UploadError('Chunk Exceeds Declared Size')
+
+    with open(upload.get_path(), 'r+b') as part_file:
+        part_file.seek(offset)
+        remaining = length
+        header = b''
+        while remaining:
+            data = stream.read(min(COPY_BUFFER_SIZE, remaining))
+            if not data:
+                raise UploadError('Incomplete Chunk')
+
+            if offset == 0 and len(header) < 12:
+                header += data[:12 - len(header)]
+                if len(header) >= min(12, upload.size) and not is_image_header(header):
+                    raise UploadError('Not An Image')
+
+            part_file.write(data)
+            remaining -= len(data)
+
+        # Drops whatever an earlier interrupted attempt wrote past this chunk
+        part_file.truncate(offset + length)
+
+    return offset + length
+
+
+def verify_image(upload):
+    if upload.offset != upload.size:
+        raise UploadError('Upload Incomplete')
+    try:
+        with Image.open(upload.get_path()) as image:
+            image.verify()
+    except Exception:  # pylint: disable=W0703
+        raise UploadError('Not An Image')
+
+
+def create_photo(upload):
+    """
+    Builds the Photo of a complete upload, the picture is hashed and copied into the storage in fixed size pieces
+    """
+
+    with transaction.atomic():
+        with open(upload.get_path(), 'rb') as part_file:
+            picture = store_content_addressed(part_file, upload.file_name)
+        return Photo.objects.create(item=upload.item, author=upload.author, picture=picture)
+
+
+def remove_part_file(upload):
+    try:
+        os.remove(upload.get_path())
+    except FileNotFoundError:
+        pass
@@ -1,47 +1,362 @@
+import time
+
+from django.db import transaction
+from django.db.models import Case, Count, F, FloatField, Sum, Value, When
+from django.core.urlresolvers import reverse
+from django.http import StreamingHttpResponse
 from django.shortcuts import get_object_or_404
+from django.utils import timezone
 
 # Create your views here.
-from rest_framework import viewsets
+from rest_framework import viewsets, mixins
 from rest_framework.decorators import list_route, detail_route
-from rest_framework.permissions import IsAuthenticatedOrReadOnly, IsAuthenticated
+from rest_framework.permissions import IsAuthenticatedOrReadOnly, IsAuthenticated, IsAdminUser
 from rest_framework.response import Response
-from rest_framework.status import HTTP_400_BAD_REQUEST, HTTP_403_FORBIDDEN
+from rest_framework.status import HTTP_200_OK, HTTP_202_ACCEPTED, HTTP_400_BAD_REQUEST, HTTP_403_FORBIDDEN, \
+    HTTP_409_CONFLICT
 
-from account.models import UserProfile
-from item.models import Item, Comment, Reaction, ReactionChoices, Photo, Rating, ItemStatusChoices
+from account.models import UserProfile, LeaderboardEntry
+from item.models import Item, Comment, Reaction, ReactionChoices, Photo, Rating, ItemStatusChoices, Reactable, \
+    ReactionActions, PendingReaction, PhotoUpload, ActivityVerbs, RatingHistogram
 from item.serializers import CreateItemSerializer, ItemSerializer, BoundingBoxSerializer, CommentSerializer, \
     PhotoSerializer, UpdateItemSerializer, AddRatingSerializer, AddCommentSerializer, \
-    AddPhotoSerializer
+    AddPhotoSerializer, HeatmapSerializer, ModerationActionSerializer, StartPhotoUploadSerializer, \
+    PhotoUploadSerializer, ActivityEntrySerializer, ItemDetailSerializer, get_author_serializer, \
+    AUTHOR_SUMMARY_SERIALIZERS
+from item.activity import record_activity, get_feed
+from item.batch import BatchRetrieveMixin, invalidate_batch_cache
+from item.events import broker, EventTypes
+from item.heatmap import get_heatmap
+from item.region_packs import get_tiles, get_region_pack
+from item.signals import publish_item
+from item.spatial_index import get_spatial_index
+from item.storage import store_content_addressed
+from item.streaming import wants_stream, iterate_batches, iterate_ids, stream_json_response
+from item.throttling import ScopedThrottleMixin
+from item.uploads import UploadError, create_part_file, write_chunk, verify_image, create_photo, remove_part_file
+from project_hermes.db_router import ReplicaReadMixin
 from project_hermes.hermes_config import Configurations
+from project_hermes.metrics import timed
 
 
 def get_author(user):
     return UserProfile.objects.filter(user=user).first()
 
+def lock_profiles(profile_ids):
+    """
+    Locks the profile rows until the end of the transaction and returns their current reputations. The rows are
+    always locked in primary key order, so two transactions locking overlapping profiles wait for each other instead
+    of deadlocking.
+    """
+
+    return dict(UserProfile.objects.select_for_update().filter(pk__in=profile_ids).order_by('pk')
+                .values_list('pk', 'reputation'))
+
+
+def mark_tier_changes(previous, reputations):
+    """
+    Flags the profiles moving to another tier, their content carries the tier in its author summary
+    """
+
+    changed = [pk for pk, reputation in reputations.items()
+               if pk in previous and UserProfile.get_tier(previous[pk]) != UserProfile.get_tier(reputation)]
+    if changed:
+        UserProfile.objects.filter(pk__in=changed).update(author_summary_stale=True)
+
+
+@timed('recalculate_reputation')
 def recalculate_reputation(profile: UserProfile):
-    comments = Comment.objects.filter(author=profile)
-    photos = Photo.objects.filter(author=profile)
-    reactions = Reaction.objects.filter(author=profile).count()
-
-    reputation = 0
-    for comment in comments:
-        reputation += comment.experience
-    for photo in photos:
-        reputation += photo.experience
-    reputation += reactions
-
-    items = Item.objects.filter(author=profile)
-    for item in items:
-        reputation += item.rating * 2
-        reputation -= item.flags * 10
-
-    profile.reputation = reputation
-    profile.save()
-
-class ItemViewSet(viewsets.ModelViewSet):
+    with transaction.atomic():
+        # Concurrent recalculations of a profile queue up on its row, the last one to run sees every change
+        previous = lock_profiles([profile.pk])
+
+        comments = Comment.objects.filter(author=profile)
+        photos = Photo.objects.filter(author=profile)
+        reactions = Reaction.objects.filter(author=profile).count()
+
+        reputation = 0
+        for comment in comments:
+            reputation += comment.experience
+        for photo in photos:
+            reputation += photo.experience
+        reputation += reactions
+
+        items = Item.all_objects.filter(author=profile)
+        for item in items:
+            reputation += item.rating * 2
+            reputation -= item.flags * 10
+
+        profile.reputation = reputation
+        UserProfile.objects.filter(pk=profile.pk).update(reputation=reputation)
+        LeaderboardEntry.objects.filter(profile=profile).update(reputation=reputation)
+        mark_tier_changes(previous, {profile.pk: reputation})
+
+
+def update_values(queryset, field, values, key='pk', output_field=None):
+    """
+    Sets `field` to values[key] on every row of the queryset whose key is in `values`, with a single UPDATE
+    """
+
+    if not values:
+        return 0
+    return queryset.filter(**{key + '__in': values}).update(**{field: Case(
+            *[When(then=Value(value), **{key: pk}) for pk, value in values.items()],
+            output_field=output_field or FloatField()
+    )})
+
+
+@timed('recalculate_reputations')
+def recalculate_reputations(profile_ids, previous=None):
+    """
+    Same as recalculate_reputation for many profiles at once, using grouped queries and a single UPDATE. Callers
+    which changed reputations in the same transaction pass the reputations they read before, as returned by
+    lock_profiles, so the tier changes are still noticed.
+    """
+
+    reputations = {profile_id: 0.0 for profile_id in profile_ids}
+    if not reputations:
+        return
+
+    with transaction.atomic():
+        locked = lock_profiles(reputations)
+        if previous is None:
+            previous = locked
+
+        for model in (Comment, Photo):
+            experiences = model.objects.filter(author__in=reputations).values_list('author') \
+                .annotate(Sum('experience'))
+            for author_id, experience in experiences:
+                reputations[author_id] += experience
+        reactions = Reaction.objects.filter(author__in=reputations).values_list('author').annotate(Count('id'))
+        for author_id, count in reactions:
+            reputations[author_id] += count
+        items = Item.all_objects.filter(author__in=reputations).values_list('author') \
+            .annotate(Sum('rating'), Sum('flags'))
+        for author_id, rating, flags in items:
+            reputations[author_id] += rating * 2 - flags * 10
+
+        update_values(UserProfile.objects.all(), 'reputation', reputations)
+        update_values(LeaderboardEntry.objects.all(), 'reputation', reputations, key='profile')
+        mark_tier_changes(previous, reputations)
+
+
+def set_items_status(item_ids, status):
+    """
+    Moves the items to the status with a single UPDATE and recalculates the reputation of their authors
+    """
+
+    items = Item.all_objects.filter(pk__in=item_ids)
+    author_ids = set(items.values_list('author', flat=True))
+    # update() skips auto_now and post_save, modified is bumped by hand so the spatial index picks the change up
+    updated = items.update(status=status, modified=timezone.now())
+    invalidate_batch_cache(Item, item_ids)
+    recalculate_reputations(author_ids)
+
+    if broker.count:
+        for item in items.select_related('author__user'):
+            publish_item(item, EventTypes.STATUS)
+    return updated
+
+
+def remove_reactables(model, reactable_ids):
+    """
+    Deletes the comments or photos along with their reactions and recalculates the reputation of everyone involved
+    """
+
+    reactables = model.objects.filter(pk__in=reactable_ids)
+    author_ids = set(reactables.values_list('author', flat=True))
+    author_ids.update(Reaction.objects.filter(reactable__in=reactable_ids).values_list('author', flat=True))
+    removed = reactables.count()
+    reactables.delete()
+    recalculate_reputations(author_ids)
+    return removed
+
+
+def with_authors(queryset, serializer_class):
+    """
+    Joins the author rows the full serializers nest, the summary serializers render the author without them
+    """
+
+    if serializer_class in AUTHOR_SUMMARY_SERIALIZERS.values():
+        return queryset
+    return queryset.select_related('author__user')
+
+
+def update_rating_histogram(item, previous, rating):
+    """
+    Moves a rating of the item from the bucket of `previous` (None for a new rating) to the bucket of `rating`.
+    Must run under the item row lock, after the rating is saved.
+    """
+
+    histogram = RatingHistogram.objects.filter(item=item).first()
+    if histogram is None:
+        # First histogram of the item, built from all its ratings, the saved one included
+        aggregates = Rating.objects.filter(item=item).aggregate(**RatingHistogram.get_aggregates())
+        return RatingHistogram.objects.create(item=item, **{field: value or 0 for field, value in aggregates.items()})
+
+    changes = {'total': F('total') + (rating - (previous or 0.0))}
+    new_field = RatingHistogram.get_field(rating)
+    if previous is None:
+        changes[new_field] = F(new_field) + 1
+    elif RatingHistogram.get_field(previous) != new_field:
+        old_field = RatingHistogram.get_field(previous)
+        changes[old_field] = F(old_field) - 1
+        changes[new_field] = F(new_field) + 1
+
+    RatingHistogram.objects.filter(pk=histogram.pk).update(**changes)
+    histogram.refresh_from_db()
+    return histogram
+
+
+def apply_reaction(author_id, reactable_id, action):
+    """
+    Updates the Reaction rows of the author on the reactable, the counters of the reactable are left untouched
+    """
+
+    votes = Reaction.objects.filter(author_id=author_id, reactable_id=reactable_id) \
+        .exclude(reaction=ReactionChoices.FLAG)
+    flags = Reaction.objects.filter(author_id=author_id, reactable_id=reactable_id, reaction=ReactionChoices.FLAG)
+
+    if action in (ReactionActions.UPVOTE, ReactionActions.DOWNVOTE):
+        value = ReactionChoices.UPVOTE if action == ReactionActions.UPVOTE else ReactionChoices.DOWNVOTE
+        reaction = votes.first()
+        if reaction:
+            reaction.reaction = value
+            reaction.save()
+        else:
+            Reaction.objects.create(reaction=value, reactable_id=reactable_id, author_id=author_id)
+    elif action == ReactionActions.FLAG:
+        if not flags.exists():
+            Reaction.objects.create(reaction=ReactionChoices.FLAG, reactable_id=reactable_id, author_id=author_id)
+    elif action == ReactionActions.UNFLAG:
+        flags.delete()
+    elif action == ReactionActions.UNVOTE:
+        votes.delete()
+
+
+def get_reaction_state(reactions, actions):
+    """
+    Returns the (vote, flagged) of an author given their reactions and the actions still to be applied on top
+    """
+
+    vote = next((reaction for reaction in reactions if reaction != ReactionChoices.FLAG), None)
+    flagged = ReactionChoices.FLAG in reactions
+    for action in actions:
+        if action == ReactionActions.UPVOTE:
+            vote = ReactionChoices.UPVOTE
+        elif action == ReactionActions.DOWNVOTE:
+            vote = ReactionChoices.DOWNVOTE
+        elif action == ReactionActions.UNVOTE:
+            vote = None
+        else:
+            flagged = action == ReactionActions.FLAG
+    return vote, flagged
+
+
+def buffer_reaction(author, reactable, action):
+    """
+    Write-behind path of the reactions. The action is appended to PendingReaction, which takes no lock on the
+    reactable row, and the counters of `reactable` are optimistically updated in memory with the effect of this
+    author's pending actions. A buffered reaction is as durable as any committed row, but the Reaction rows,
+    counters, scores and reputations only reflect it after the next flush_reactions run.
+
+    Returns whether the action changed the state of the author on the reactable.
+    """
+
+    PendingReaction.objects.create(reactable=reactable, author=author, action=action)
+
+    reactions = list(Reaction.objects.filter(author=author, reactable=reactable).values_list('reaction', flat=True))
+    pending = list(PendingReaction.objects.filter(author=author, reactable=reactable).order_by('id')
+                   .values_list('action', flat=True))
+    before_vote, before_flagged = get_reaction_state(reactions, [])
+    after_vote, after_flagged = get_reaction_state(reactions, pending)
+
+    for vote, change in ((before_vote, -1), (after_vote, 1)):
+        if vote == ReactionChoices.UPVOTE:
+            reactable.upvotes += change
+        elif vote == ReactionChoices.DOWNVOTE:
+            reactable.downvotes += change
+    reactable.flags += int(after_flagged) - int(before_flagged)
+    return get_reaction_state(reactions, pending[:-1]) != (after_vote, after_flagged)
+
+
+@timed('flush_pending_reactions')
+def flush_pending_reactions(batch_size=1000):
+    """
+    Applies the oldest buffered reactions in one transaction, the counters of every touched reactable are written
+    with a single UPDATE and the reputations are recalculated in batch. Returns the number of reactions applied.
+    """
+
+    with transaction.atomic():
+        pending = list(PendingReaction.objects.select_for_update().order_by('id')[:batch_size])
+        if not pending:
+            return 0
+
+        for entry in pending:
+            apply_reaction(entry.author_id, entry.reactable_id, entry.action)
+
+        reactable_ids = {entry.reactable_id for entry in pending}
+        reactables = Reactable.objects.select_for_update().order_by('pk').in_bulk(list(reactable_ids))
+        for reactable in reactables.values():
+            reactable.upvotes = reactable.downvotes = reactable.flags = 0
+        counts = Reaction.objects.filter(reactable__in=reactable_ids).values_list('reactable', 'reaction') \
+            .annotate(Count('id')).order_by()
+        for reactable_id, reaction, count in counts:
+            reactable = reactables[reactable_id]
+            if reaction == ReactionChoices.UPVOTE:
+                reactable.upvotes = count
+            elif reaction == ReactionChoices.DOWNVOTE:
+                reactable.downvotes = count
+            elif reaction == ReactionChoices.FLAG:
+                reactable.flags = count
+
+        for reactable in reactables.values():
+            Reactable.objects.filter(pk=reactable.pk).update(upvotes=reactable.upvotes,
+                                                             downvotes=reactable.downvotes,
+                                                             flags=reactable.flags,
+                                                             experience=Reactable.recalculate_score(reactable))
+
+        PendingReaction.objects.filter(pk__in=[entry.pk for entry in pending]).delete()
+        for model in (Comment, Photo):
+            invalidate_batch_cache(model, reactable_ids)
+
+        author_ids = {entry.author_id for entry in pending}
+        for model in (Comment, Photo):
+            author_ids.update(model.objects.filter(pk__in=reactable_ids).values_list('author', flat=True))
+        recalculate_reputations(author_ids)
+
+    return len(pending)
+
+
+class ItemViewSet(BatchRetrieveMixin, ScopedThrottleMixin, ReplicaReadMixin, viewsets.ModelViewSet):
     queryset = Item.objects.all()
     serializer_class = ItemSerializer
     permission_classes = [IsAuthenticatedOrReadOnly]
+    replica_actions = ('list', 'retrieve', 'search_bounding_box', 'heatmap', 'get_comments', 'get_photos')
+    throttle_scopes = {
+        'create': 'write',
+        'update': 'write',
+        'partial_update': 'write',
+        'add_rating': 'write',
+        'add_comment': 'write',
+        'add_photo': 'write',
+        'start_photo_upload': 'write',
+        'region_packs': 'region_pack',
+    }
+
+    def get_serializer_class(self):
+        if self.action == 'retrieve':
+            return ItemDetailSerializer
+        return get_author_serializer(self.request, self.serializer_class)
+
+    def list(self, request, *args, **kwargs):
+        if not wants_stream(request):
+            return super().list(request, *args, **kwargs)
+
+        serializer_class = self.get_serializer_class()
+        queryset = with_authors(self.filter_queryset(self.get_queryset()), serializer_class)
+        return stream_json_response(request, iterate_batches(queryset, Configurations.STREAM_BATCH_SIZE),
+                                    serializer_class)
 
     @staticmethod
     def is_valid_location(latitude, longitude):
@@ -74,6 +389,9 @@ class ItemViewSet(viewsets.ModelViewSet):
                         author=author,
                         status=status,
                 )
+                LeaderboardEntry.objects.get_or_create(region=LeaderboardEntry.get_region(latitude, longitude),
+                                                       profile=author)
+                record_activity(author.id, ActivityVerbs.ITEM, item.id, author.id)
             recalculate_reputation(author)
             return Response(self.serializer_class(item).data)
         else:
@@ -95,15 +413,152 @@ class ItemViewSet(viewsets.ModelViewSet):
             min_longitude = serialized_data.validated_data['min_longitude']
             max_longitude = serialized_data.validated_data['max_longitude']
 
-            items = self.get_queryset().filter(latitude__range=[min_latitude, max_latitude],
-                                               longitude__range=[min_longitude, max_longitude])
+            spatial_index = get_spatial_index()
+            if spatial_index is not None:
+                item_ids = spatial_index.search(min_latitude, max_latitude, min_longitude, max_longitude)
+            else:
+                items = self.get_queryset().filter(latitude__range=[min_latitude, max_latitude],
+                                                   longitude__range=[min_longitude, max_longitude])
+
+            serializer_class = self.get_serializer_class()
+            if wants_stream(request):
+                queryset = with_authors(self.get_queryset(), serializer_class)
+                if spatial_index is not None:
+                    batches = iterate_ids(queryset, item_ids, Configurations.STREAM_BATCH_SIZE)
+                else:
+                    batches = iterate_batches(with_authors(items, serializer_class), Configurations.STREAM_BATCH_SIZE)
+                return stream_json_response(request, batches, serializer_class, 'results')
+
+            if spatial_index is not None:
+                items_by_id = self.get_queryset().in_bulk(item_ids)
+                items = [items_by_id[item_id] for item_id in item_ids if item_id in items_by_id]
             response = {
-                'results': self.serializer_class(items, many=True).data
+                'results': serializer_class(items, many=True).data
             }
             return Response(response)
         else:
             return Response({'success': False, 'message': 'Incorrect Data Sent'}, status=HTTP_400_BAD_REQUEST)
 
+    @list_route(permission_classes=[])
+    def events(self, request):
+        """
+        Server-sent events stream of the items created, updated or changing status inside the Bounding Box
+        ---
+        parameters_strategy:
+            query: replace
+        parameters:
+            - name: min_latitude
+              paramType: query
+            - name: max_latitude
+              paramType: query
+            - name: min_longitude
+              paramType: query
+            - name: max_longitude
+              paramType: query
+        """
+
+        serialized_data = BoundingBoxSerializer(data=request.query_params)
+        if not serialized_data.is_valid():
+            return Response({'success': False, 'message': 'Incorrect Data Sent'}, status=HTTP_400_BAD_REQUEST)
+
+        subscription = broker.subscribe(serialized_data.validated_data['min_latitude'],
+                                        serialized_data.validated_data['max_latitude'],
+                                        serialized_data.validated_data['min_longitude'],
+                                        serialized_data.validated_data['max_longitude'])
+
+        def stream():
+            try:
+                yield 'retry: 5000\n\n'
+                deadline = time.monotonic() + Configurations.EVENT_STREAM_DURATION
+                while time.monotonic() < deadline:
+                    message = subscription.get(Configurations.EVENT_HEARTBEAT_INTERVAL)
+                    yield message if message is not None else ': keepalive\n\n'
+            finally:
+                broker.unsubscribe(subscription)
+
+        response = StreamingHttpResponse(stream(), content_type='text/event-stream')
+        response['Cache-Control'] = 'no-cache'
+        response['X-Accel-Buffering'] = 'no'
+        return response
+
+    @list_route(methods=['POST'], permission_classes=[])
+    def heatmap(self, request):
+        """
+        Get item density and average rating over a grid of the Bounding Box, grown to the shared grid cells, the
+        bounds of the result are the ones used
+        ---
+        request_serializer: HeatmapSerializer
+        """
+
+        serialized_data = HeatmapSerializer(data=request.data)
+
+        if serialized_data.is_valid():
+            min_latitude = serialized_data.validated_data['min_latitude']
+            max_latitude = serialized_data.validated_data['max_latitude']
+            min_longitude = serialized_data.validated_data['min_longitude']
+            max_longitude = serialized_data.validated_data['max_longitude']
+            rows = serialized_data.validated_data['rows']
+            columns = serialized_data.validated_data['columns']
+
+            if min_latitude >= max_latitude or min_longitude >= max_longitude:
+                return Response({'success': False, 'message': 'Incorrect Bounding Box'}, status=HTTP_400_BAD_REQUEST)
+            if max(rows, columns) > Configurations.MAX_HEATMAP_CELLS:
+                return Response({'success': False, 'message': 'Grid Too Large'}, status=HTTP_400_BAD_REQUEST)
+
+            heatmap = get_heatmap(Item.objects.all(), min_latitude, max_latitude, min_longitude, max_longitude,
+                                  rows, columns)
+            return Response({'success': True, 'result': heatmap})
+        else:
+            return Response({'success': False, 'message': 'Incorrect Data Sent'}, status=HTTP_400_BAD_REQUEST)
+
+    @list_route(methods=['POST'], permission_classes=[IsAuthenticated])
+    def region_packs(self, request):
+        """
+        Offline packs of the tiles covering the bounding box. Missing tiles are listed in pending and queued for
+        build_region_packs, the response is then 202 and the client polls again later.
+        ---
+        request_serializer: BoundingBoxSerializer
+        """
+
+        serialized_data = BoundingBoxSerializer(data=request.data)
+        if not serialized_data.is_valid():
+            return Response({'success': False, 'message': 'Incorrect Data Sent'}, status=HTTP_400_BAD_REQUEST)
+
+        tiles = get_tiles(serialized_data.validated_data['min_latitude'],
+                          serialized_data.validated_data['max_latitude'],
+                          serialized_data.validated_data['min_longitude'],
+                          serialized_data.validated_data['max_longitude'])
+        if not tiles or len(tiles) > Configurations.REGION_PACK_MAX_TILES:
+            return Response({'success': False, 'message': 'Incorrect Bounding Box'}, status=HTTP_400_BAD_REQUEST)
+
+        results = []
+        pending = []
+        for row, column in tiles:
+            pack = get_region_pack(row, column, build=False)
+            if pack is None:
+                pending.append([row, column])
+                continue
+            version, name, size = pack
+            results.append({
+                'tile': [row, column],
+                'version': version,
+                'size': size,
+                'url': request.build_absolute_uri(reverse('region-pack', kwargs={'name': name})),
+            })
+        response = {
+            'success': True,
+            'results': results,
+            'pending': pending,
+        }
+        return Response(response, status=HTTP_202_ACCEPTED if pending else HTTP_200_OK)
+
+    @list_route(permission_classes=[IsAdminUser])
+    def spatial_index_stats(self, request):
+        spatial_index = get_spatial_index()
+        if spatial_index is None:
+            return Response({'success': False, 'message': 'Spatial Index Disabled'})
+        return Response({'success': True, 'result': spatial_index.stats()})
+
     @detail_route(permission_classes=[IsAuthenticated])
     def get_user_comment(self, request, pk):
         item = get_object_or_404(Item, pk=pk)
@@ -121,8 +576,14 @@ class ItemViewSet(viewsets.ModelViewSet):
     def get_comments(self, request, pk):
         item = get_object_or_404(Item, pk=pk)
         comments = item.comments.all()
+        serializer_class = get_author_serializer(request, CommentSerializer)
+        if wants_stream(request):
+            return stream_json_response(request, iterate_batches(with_authors(comments, serializer_class),
+                                                                 Configurations.STREAM_BATCH_SIZE),
+                                        serializer_class, 'results')
+
         response = {
-            'results': CommentSerializer(comments, many=True).data
+            'results': serializer_class(comments, many=True).data
         }
         return Response(response)
 
@@ -131,7 +592,7 @@ class ItemViewSet(viewsets.ModelViewSet):
         item = get_object_or_404(Item, pk=pk)
         photos = item.photos.all()
         response = {
-            'results': PhotoSerializer(photos, many=True).data
+            'results': get_author_serializer(request, PhotoSerializer)(photos, many=True).data
         }
         return Response(response)
 
@@ -171,26 +632,30 @@ class ItemViewSet(viewsets.ModelViewSet):
             if not (0.0 <= serialized_data.validated_data['rating'] <= 5.0):
                 return Response({'success': False, 'message': 'Incorrect Rating'}, status=HTTP_400_BAD_REQUEST)
 
-            rating = Rating.objects.filter(item=item, author__user=request.user).first()
-            if rating:
-                rating.rating = serialized_data.validated_data['rating']
-                rating.save()
-
-                item.recalculate_rating()
-                item.save()
-            else:
-                rating = Rating.objects.create(
-                        rating=serialized_data.validated_data['rating'],
-                        item=item,
-                        author=get_author(request.user),
-                )
-
-                item.recalculate_rating()
-                item.save()
-            recalculate_reputation(rating.author)
+            with transaction.atomic():
+                # Ratings of the item are serialized on its row, the average is computed from all of them
+                item = Item.objects.select_for_update().get(pk=item.pk)
+                rating = Rating.objects.filter(item=item, author__user=request.user).first()
+                previous = rating.rating if rating else None
+                if rating:
+                    rating.rating = serialized_data.validated_data['rating']
+                    rating.save()
+                else:
+                    rating = Rating.objects.create(
+                            rating=serialized_data.validated_data['rating'],
+                            item=item,
+                            author=get_author(request.user),
+                    )
+
+                histogram = update_rating_histogram(item, previous, rating.rating)
+                count = sum(histogram.get_counts())
+                item.rating = histogram.total / count if count else 0.0
+                item.save(update_fields=['rating', 'modified'])
+                record_activity(rating.author_id, ActivityVerbs.RATING, item.id, item.author_id, value=rating.rating)
+            recalculate_reputation(item.author)
             response = {
                 'success': True,
-                'result': self.serializer_class(item).data
+                'result': ItemDetailSerializer(item).data
             }
             return Response(response)
         else:
@@ -217,6 +682,7 @@ class ItemViewSet(viewsets.ModelViewSet):
                         item=item,
                         author=get_author(request.user),
                 )
+                record_activity(comment.author_id, ActivityVerbs.COMMENT, item.id, item.author_id, comment.id)
             response = {
                 'success': True,
                 'result': CommentSerializer(comment).data
@@ -237,11 +703,14 @@ class ItemViewSet(viewsets.ModelViewSet):
         item = self.get_object()
         serialized_data = AddPhotoSerializer(data=request.data)
         if serialized_data.is_valid():
-            photo = Photo.objects.create(
-                    picture=serialized_data.validated_data['picture'],
-                    item=item,
-                    author=get_author(request.user),
-            )
+            picture = serialized_data.validated_data['picture']
+            with transaction.atomic():
+                photo = Photo.objects.create(
+                        picture=store_content_addressed(picture, picture.name),
+                        item=item,
+                        author=get_author(request.user),
+                )
+            record_activity(photo.author_id, ActivityVerbs.PHOTO, item.id, item.author_id, photo.id)
             recalculate_reputation(photo.author)
             response = {
                 'success': True,
@@ -251,91 +720,126 @@ class ItemViewSet(viewsets.ModelViewSet):
         else:
             return Response({'success': False, 'message': 'Incorrect Data Sent'}, status=HTTP_400_BAD_REQUEST)
 
+    @detail_route(methods=['POST'], permission_classes=[IsAuthenticated])
+    def start_photo_upload(self, request, pk):
+        """
+        start a resumable upload of a photo of the item, the chunks are then sent to photo-upload/<id>/chunk/
+        ---
+        request_serializer: StartPhotoUploadSerializer
+        """
 
-class ReactableViewSet(viewsets.ModelViewSet):
-    @staticmethod
-    def handle_upvote(request, pk, reactable):
-        reaction = Reaction.objects.filter(author__user=request.user, reactable=reactable) \
-            .exclude(reaction=ReactionChoices.FLAG).first()
-        if reaction:
-            reaction.reaction = ReactionChoices.UPVOTE
-            reaction.save()
-        else:
-            Reaction.objects.create(
-                    reaction=ReactionChoices.UPVOTE,
-                    reactable=reactable,
+        item = self.get_object()
+        serialized_data = StartPhotoUploadSerializer(data=request.data)
+        if serialized_data.is_valid():
+            if serialized_data.validated_data['size'] > Configurations.MAX_PHOTO_UPLOAD_SIZE:
+                return Response({'success': False, 'message': 'Photo Too Large'}, status=HTTP_400_BAD_REQUEST)
+
+            upload = PhotoUpload.objects.create(
+                    item=item,
                     author=get_author(request.user),
+                    file_name=serialized_data.validated_data['file_name'],
+                    size=serialized_data.validated_data['size'],
             )
+            create_part_file(upload)
+            response = {
+                'success': True,
+                'result': PhotoUploadSerializer(upload).data
+            }
+            return Response(response)
+        else:
+            return Response({'success': False, 'message': 'Incorrect Data Sent'}, status=HTTP_400_BAD_REQUEST)
 
-        reactable.recalculate_votes()
-        reactable.recalculate_score()
-        reactable.save()
 
-        return reactable
+class ReactableViewSet(BatchRetrieveMixin, ScopedThrottleMixin, ReplicaReadMixin, viewsets.ModelViewSet):
+    replica_actions = ('list', 'retrieve')
+    throttle_scopes = {
+        'upvote': 'reaction',
+        'downvote': 'reaction',
+        'flag': 'reaction',
+        'unflag': 'reaction',
+        'unvote': 'reaction',
+    }
+    # Reactions shown in the activity feeds, taking a vote or a flag back is not
+    ACTIVITY_VERBS = {
+        ReactionActions.UPVOTE: ActivityVerbs.UPVOTE,
+        ReactionActions.DOWNVOTE: ActivityVerbs.DOWNVOTE,
+        ReactionActions.FLAG: ActivityVerbs.FLAG,
+    }
+
+    def get_serializer_class(self):
+        return get_author_serializer(self.request, self.serializer_class)
 
     @staticmethod
-    def handle_downvote(request, pk, reactable):
-        reaction = Reaction.objects.filter(author__user=request.user, reactable=reactable) \
-            .exclude(reaction=ReactionChoices.FLAG).first()
-        if reaction:
-            reaction.reaction = ReactionChoices.DOWNVOTE
-            reaction.save()
-
-        else:
-            Reaction.objects.create(
-                    reaction=ReactionChoices.DOWNVOTE,
-                    reactable=reactable,
-                    author=get_author(request.user),
-            )
+    def handle_reaction(request, reactable, action):
+        apply_reaction(get_author(request.user).id, reactable.id, action)
 
         reactable.recalculate_votes()
         reactable.recalculate_score()
-        reactable.save()
+        reactable.save(update_fields=['upvotes', 'downvotes', 'flags', 'experience'])
 
         return reactable
 
     @staticmethod
-    def handle_flag(request, pk, reactable):
-        reaction = Reaction.objects.filter(author__user=request.user, reactable=reactable,
-                                           reaction=ReactionChoices.FLAG).first()
-        if not reaction:
-            Reaction.objects.create(
-                    reaction=ReactionChoices.FLAG,
-                    reactable=reactable,
-                    author=get_author(request.user),
-            )
+    def handle_upvote(request, pk, reactable):
+        return ReactableViewSet.handle_reaction(request, reactable, ReactionActions.UPVOTE)
 
-        reactable.recalculate_votes()
-        reactable.recalculate_score()
-        reactable.save()
+    @staticmethod
+    def handle_downvote(request, pk, reactable):
+        return ReactableViewSet.handle_reaction(request, reactable, ReactionActions.DOWNVOTE)
 
-        return reactable
+    @staticmethod
+    def handle_flag(request, pk, reactable):
+        return ReactableViewSet.handle_reaction(request, reactable, ReactionActions.FLAG)
 
     @staticmethod
     def handle_unflag(request, pk, reactable):
-        reaction = Reaction.objects.filter(author__user=request.user, reactable=reactable,
-                                           reaction=ReactionChoices.FLAG).first()
-        if reaction:
-            reaction.delete()
-
-        reactable.recalculate_votes()
-        reactable.recalculate_score()
-        reactable.save()
-
-        return reactable
+        return ReactableViewSet.handle_reaction(request, reactable, ReactionActions.UNFLAG)
 
     @staticmethod
     def handle_unvote(request, pk, reactable):
-        reaction = Reaction.objects.filter(author__user=request.user, reactable=reactable) \
-            .exclude(reaction=ReactionChoices.FLAG).first()
-        if reaction:
-            reaction.delete()
+        return ReactableViewSet.handle_reaction(request, reactable, ReactionActions.UNVOTE)
 
-        reactable.recalculate_votes()
-        reactable.recalculate_score()
-        reactable.save()
+    def react(self, request, pk, action):
+        reactable = self.get_object()
+        voter = get_author(request.user)
 
-        return reactable
+        if Configurations.WRITE_BEHIND_REACTIONS:
+            with transaction.atomic():
+                changed = buffer_reaction(voter, reactable, action)
+                self.record_reaction(voter, reactable, action, changed)
+            response = {
+                'pending': True,
+                'result': self.serializer_class(reactable).data
+            }
+            return Response(response)
+
+        with transaction.atomic():
+            # The votes of the reactable are recounted under its row lock, so parallel votes on it are serialized,
+            # and both profiles are locked before the author's reputation is incremented
+            reactable = self.get_queryset().select_for_update().get(pk=reactable.pk)
+            previous = lock_profiles([reactable.author_id, voter.id])
+            reactions = list(Reaction.objects.filter(author=voter, reactable=reactable)
+                             .values_list('reaction', flat=True))
+            reactable = getattr(self, 'handle_' + action)(request, pk, reactable)
+            # The score change was already added to the author's reputation, the tiers are compared with the
+            # reputations read under the lock before it
+            recalculate_reputations([reactable.author_id, voter.id], previous)
+            changed = get_reaction_state(reactions, []) != get_reaction_state(reactions, [action])
+            self.record_reaction(voter, reactable, action, changed)
+        response = {
+            'result': self.serializer_class(reactable).data
+        }
+        return Response(response)
+
+    def record_reaction(self, voter, reactable, action, changed):
+        """
+        Adds the reaction to the activity feeds, in the transaction applying it and only when it changed anything,
+        so upvoting twice is a single entry
+        """
+
+        if changed and action in self.ACTIVITY_VERBS:
+            record_activity(voter.id, self.ACTIVITY_VERBS[action], reactable.item_id, reactable.author_id,
+                            reactable.id)
 
     @detail_route(methods=['POST'], permission_classes=[IsAuthenticated])
     def upvote(self, request, pk):
@@ -345,13 +849,7 @@ class ReactableViewSet(viewsets.ModelViewSet):
             form: replace
         """
 
-        reactable = self.handle_upvote(request, pk, self.get_object())
-        recalculate_reputation(reactable.author)
-        recalculate_reputation(request.user)
-        response = {
-            'result': self.serializer_class(reactable).data
-        }
-        return Response(response)
+        return self.react(request, pk, ReactionActions.UPVOTE)
 
     @detail_route(methods=['POST'], permission_classes=[IsAuthenticated])
     def downvote(self, request, pk):
@@ -361,13 +859,7 @@ class ReactableViewSet(viewsets.ModelViewSet):
             form: replace
         """
 
-        reactable = self.handle_downvote(request, pk, self.get_object())
-        recalculate_reputation(reactable.author)
-        recalculate_reputation(request.user)
-        response = {
-            'result': self.serializer_class(reactable).data
-        }
-        return Response(response)
+        return self.react(request, pk, ReactionActions.DOWNVOTE)
 
     @detail_route(methods=['POST'], permission_classes=[IsAuthenticated])
     def flag(self, request, pk):
@@ -377,13 +869,7 @@ class ReactableViewSet(viewsets.ModelViewSet):
             form: replace
         """
 
-        reactable = self.handle_flag(request, pk, self.get_object())
-        recalculate_reputation(reactable.author)
-        recalculate_reputation(request.user)
-        response = {
-            'result': self.serializer_class(reactable).data
-        }
-        return Response(response)
+        return self.react(request, pk, ReactionActions.FLAG)
 
     @detail_route(methods=['POST'], permission_classes=[IsAuthenticated])
     def unvote(self, request, pk):
@@ -393,13 +879,7 @@ class ReactableViewSet(viewsets.ModelViewSet):
             form: replace
         """
 
-        reactable = self.handle_unvote(request, pk, self.get_object())
-        recalculate_reputation(reactable.author)
-        recalculate_reputation(request.user)
-        response = {
-            'result': self.serializer_class(reactable).data
-        }
-        return Response(response)
+        return self.react(request, pk, ReactionActions.UNVOTE)
 
     @detail_route(methods=['POST'], permission_classes=[IsAuthenticated])
     def unflag(self, request, pk):
@@ -409,11 +889,159 @@ class ReactableViewSet(viewsets.ModelViewSet):
             form: replace
         """
 
-        reactable = self.handle_unflag(request, pk, self.get_object())
-        recalculate_reputation(reactable.author)
-        recalculate_reputation(request.user)
+        return self.react(request, pk, ReactionActions.UNFLAG)
+
+
+class ModerationViewSet(viewsets.ViewSet):
+    """
+    Queue of the flagged content, most flagged and most recent first
+    """
+
+    permission_classes = [IsAdminUser]
+
+    QUEUES = {
+        'item': (Item.all_objects, ItemSerializer),
+        'comment': (Comment.objects, CommentSerializer),
+        'photo': (Photo.objects, PhotoSerializer),
+    }
+
+    def list(self, request):
+        try:
+            limit = max(1, min(int(request.query_params.get('limit', Configurations.MODERATION_QUEUE_SIZE)),
+                               Configurations.MODERATION_QUEUE_SIZE))
+        except ValueError:
+            return Response({'success': False, 'message': 'Incorrect Data Sent'}, status=HTTP_400_BAD_REQUEST)
+
+        queue_types = [request.query_params['type']] if 'type' in request.query_params else self.QUEUES.keys()
+        response = {}
+        for queue_type in queue_types:
+            if queue_type not in self.QUEUES:
+                return Response({'success': False, 'message': 'Incorrect Type'}, status=HTTP_400_BAD_REQUEST)
+
+            manager, serializer_class = self.QUEUES[queue_type]
+            queryset = manager.filter(flags__gt=0).select_related('author__user').order_by('-flags', '-timestamp')
+            if queue_type == 'item':
+                queryset = queryset.exclude(status=ItemStatusChoices.REMOVED)
+            response[queue_type] = serializer_class(queryset[:limit], many=True).data
+        return Response(response)
+
+    @list_route(methods=['POST'])
+    def verify(self, request):
+        """
+        Verify the items in bulk
+        ---
+        request_serializer: ModerationActionSerializer
+        """
+
+        serialized_data = ModerationActionSerializer(data=request.data)
+        if serialized_data.is_valid():
+            if serialized_data.validated_data['type'] != 'item':
+                return Response({'success': False, 'message': 'Incorrect Type'}, status=HTTP_400_BAD_REQUEST)
+
+            updated = set_items_status(serialized_data.validated_data['ids'], ItemStatusChoices.VERIFIED)
+            return Response({'success': True, 'updated': updated})
+        else:
+            return Response({'success': False, 'message': 'Incorrect Data Sent'}, status=HTTP_400_BAD_REQUEST)
+
+    @list_route(methods=['POST'])
+    def remove(self, request):
+        """
+        Remove items, comments or photos in bulk
+        ---
+        request_serializer: ModerationActionSerializer
+        """
+
+        serialized_data = ModerationActionSerializer(data=request.data)
+        if serialized_data.is_valid():
+            queue_type = serialized_data.validated_data['type']
+            ids = serialized_data.validated_data['ids']
+            if queue_type == 'item':
+                updated = set_items_status(ids, ItemStatusChoices.REMOVED)
+            else:
+                updated = remove_reactables(Comment if queue_type == 'comment' else Photo, ids)
+            return Response({'success': True, 'updated': updated})
+        else:
+            return Response({'success': False, 'message': 'Incorrect Data Sent'}, status=HTTP_400_BAD_REQUEST)
+
+
+class PhotoUploadViewSet(mixins.RetrieveModelMixin, viewsets.GenericViewSet):
+    """
+    Resumable photo uploads, retrieve gives the offset to resume from
+    """
+
+    queryset = PhotoUpload.objects.all()
+    serializer_class = PhotoUploadSerializer
+    permission_classes = [IsAuthenticated]
+
+    def get_queryset(self):
+        return self.queryset.filter(author__user=self.request.user)
+
+    @detail_route(methods=['POST', 'PUT'])
+    def chunk(self, request, pk):
+        """
+        append the raw request body to the upload, `offset` query parameter must be the current offset
+        ---
+        parameters_strategy:
+            form: replace
+        parameters:
+            - name: offset
+              paramType: query
+        """
+
+        upload = self.get_object()
+        with transaction.atomic():
+            # Writers of the same upload queue up on its row, the offset is checked and the chunk written by one
+            # at a time. expire_photo_uploads takes the same lock before deleting the part file.
+            upload = PhotoUpload.objects.select_for_update().get(pk=upload.pk)
+            if upload.photo_id:
+                return Response({'success': False, 'message': 'Upload Finalized'}, status=HTTP_409_CONFLICT)
+            if upload.is_expired():
+                return Response({'success': False, 'message': 'Upload Expired'}, status=HTTP_409_CONFLICT)
+
+            try:
+                offset = int(request.query_params['offset'])
+                length = int(request.META.get('CONTENT_LENGTH') or 0)
+                upload.offset = write_chunk(upload, offset, request.stream, length)
+            except (KeyError, ValueError):
+                return Response({'success': False, 'message': 'Incorrect Data Sent'}, status=HTTP_400_BAD_REQUEST)
+            except UploadError as error:
+                return Response({'success': False, 'message': str(error), 'offset': upload.offset},
+                                status=HTTP_409_CONFLICT)
+            upload.save(update_fields=['offset'])
+
+        return Response({'success': True, 'result': self.serializer_class(upload).data})
+
+    @detail_route(methods=['POST'])
+    def finalize(self, request, pk):
+        """
+        verify the uploaded photo and attach it to the item
+        ---
+        parameters_strategy:
+            form: replace
+        """
+
+        upload = self.get_object()
+        with transaction.atomic():
+            upload = PhotoUpload.objects.select_for_update().get(pk=upload.pk)
+            if upload.is_expired():
+                return Response({'success': False, 'message': 'Upload Expired'}, status=HTTP_409_CONFLICT)
+            if not upload.photo_id:
+                try:
+                    verify_image(upload)
+                except UploadError as error:
+                    return Response({'success': False, 'message': str(error), 'offset': upload.offset},
+                                    status=HTTP_409_CONFLICT)
+
+                upload.photo = create_photo(upload)
+                upload.save()
+                record_activity(upload.author_id, ActivityVerbs.PHOTO, upload.item_id, upload.item.author_id,
+                                upload.photo_id)
+                transaction.on_commit(lambda: remove_part_file(upload))
+
+        recalculate_reputation(upload.author)
         response = {
-            'result': self.serializer_class(reactable).data
+            'success': True,
+            'result': PhotoSerializer(upload.photo).data
         }
         return Response(response)
 
@@ -428,3 +1056,26 @@ class PhotoViewSet(ReactableViewSet):
     queryset = Photo.objects.all()
     serializer_class = PhotoSerializer
     permission_classes = [IsAuthenticatedOrReadOnly]
+
+
+class ActivityFeedViewSet(ReplicaReadMixin, viewsets.ViewSet):
+    """
+    Activity feed of the current user, newest first. Pages are chained with `before`, the `next` of the previous one.
+    """
+
+    permission_classes = [IsAuthenticated]
+
+    def list(self, request):
+        try:
+            before = int(request.query_params['before']) if 'before' in request.query_params else None
+            limit = max(1, min(int(request.query_params.get('limit', Configurations.ACTIVITY_FEED_PAGE_SIZE)),
+                               Configurations.ACTIVITY_FEED_PAGE_SIZE))
+        except ValueError:
+            return Response({'success': False, 'message': 'Incorrect Data Sent'}, status=HTTP_400_BAD_REQUEST)
+
+        entries = get_feed(get_author(request.user).id, before, limit)
+        response = {
+            'results': ActivityEntrySerializer(entries, many=True).data,
+            'next': entries[-1].id if len(entries) == limit else None
+        }
+        return Response(response)
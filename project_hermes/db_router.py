@@ -0,0 +1,63 @@
+"""
+Routing of the read-only API traffic to the read replicas.
+
+Reads only go to a replica while a view whitelisted through ReplicaReadMixin.replica_actions is running, everything
+else (writes, authentication, admin, management commands) stays on the primary. A user who just wrote something is
+pinned to the primary for Configurations.REPLICA_STICKY_SECONDS so they read their own writes despite replica lag.
+"""
+
+import random
+import threading
+
+from django.conf import settings
+from django.core.cache import cache
+from rest_framework.permissions import SAFE_METHODS
+
+from project_hermes.hermes_config import Configurations
+
+_state = threading.local()
+
+
+class ReplicaRouter:
+    def db_for_read(self, model, **hints):
+        if getattr(_state, 'use_replica', False) and settings.DATABASE_REPLICAS:
+            return random.choice(settings.DATABASE_REPLICAS)
+        return 'default'
+
+    def db_for_write(self, model, **hints):
+        return 'default'
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Replicas hold the same data as the primary
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        return None
+
+
+def get_sticky_key(user):
+    return 'db_router:sticky:%d' % user.pk
+
+
+class ReplicaReadMixin:
+    """
+    ViewSet mixin that sends the reads of `replica_actions` to the replicas unless the user was recently pinned
+    """
+
+    replica_actions = ('list', 'retrieve')
+
+    def initial(self, request, *args, **kwargs):
+        super().initial(request, *args, **kwargs)
+
+        use_replica = self.action in self.replica_actions
+        if use_replica and request.user.is_authenticated():
+            use_replica = not cache.get(get_sticky_key(request.user))
+        _state.use_replica = use_replica
+
+    def finalize_response(self, request, response, *args, **kwargs):
+        _state.use_replica = False
+
+        is_write = request.method not in SAFE_METHODS and self.action not in self.replica_actions
+        if is_write and response.status_code < 400 and request.user.is_authenticated():
+            cache.set(get_sticky_key(request.user), True, Configurations.REPLICA_STICKY_SECONDS)
+        return super().finalize_response(request, response, *args, **kwargs)
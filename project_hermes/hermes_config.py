@@ -1,3 +1,96 @@
-
 class Configurations:
-    AUTO_VERIFICATION_REPUTATION = 500
\ No newline at end of file
+    AUTO_VERIFICATION_REPUTATION = 500
+
+    # Reputations from which the authors move up a tier, tier 0 is below the first one
+    REPUTATION_TIERS = (0, 100, 500, 2000)
+    # Profiles whose author summary is rewritten per batch by propagate_author_summaries
+    AUTHOR_SUMMARY_BATCH_SIZE = 200
+
+    # Unverified items are returned by Item.objects along with the verified ones
+    SHOW_UNVERIFIED_ITEMS = True
+
+    # Maximum number of entries returned per content type by the moderation queue
+    MODERATION_QUEUE_SIZE = 100
+
+    # Side in degrees of the regions of the regional leaderboards
+    LEADERBOARD_REGION_SIZE = 1.0
+    LEADERBOARD_SIZE = 50
+    # Ranks add up a cached histogram of the reputations, buckets double in width every BUCKETS_PER_OCTAVE buckets
+    LEADERBOARD_RANK_BUCKETS_PER_OCTAVE = 4
+    LEADERBOARD_RANK_CACHE_TIMEOUT = 300
+
+    # Seconds a user keeps reading from the primary database after a write
+    REPLICA_STICKY_SECONDS = 10
+
+    # Item event streams: subscription tile side in degrees, subscriptions spanning more tiles than EVENT_MAX_TILES
+    # are checked against every event, streams are closed after EVENT_STREAM_DURATION seconds
+    EVENT_TILE_SIZE = 0.25
+    EVENT_MAX_TILES = 256
+    EVENT_QUEUE_SIZE = 100
+    EVENT_HEARTBEAT_INTERVAL = 15
+    EVENT_STREAM_DURATION = 300
+
+    # Fraction of the requests profiled by ProfilingMiddleware on top of the ones staff ask for
+    PROFILE_SAMPLE_RATE = 0.0
+
+    # Metrics are snapshotted per worker every METRICS_FLUSH_INTERVAL seconds and served to METRICS_ALLOWED_IPS
+    METRICS_FLUSH_INTERVAL = 5
+    METRICS_ALLOWED_IPS = ['127.0.0.1']
+    METRICS_COUNT_QUERIES = True
+    # Snapshots of exited workers are dropped once they are this many seconds old
+    METRICS_SNAPSHOT_MAX_AGE = 3600
+
+    # Token buckets of the throttled routes, (burst capacity, tokens refilled per second) per user and per IP
+    THROTTLE_BUDGETS = {
+        'write': (20, 0.2),
+        'reaction': (30, 0.5),
+        'region_pack': (5, 0.02),
+    }
+
+    # Reactions are appended to PendingReaction and applied by the flush_reactions command
+    WRITE_BEHIND_REACTIONS = False
+
+    # Unfiltered admin changelists of tables estimated above this many rows show the estimate instead of COUNT(*)
+    ADMIN_APPROXIMATE_COUNT_THRESHOLD = 100000
+
+    # The swagger API docs are only mounted in DEBUG or when enabled here
+    API_DOCS_ENABLED = False
+    WARMUP_ON_START = True
+    # Set when the server imports the application once and forks the workers from it (gunicorn --preload), the
+    # warmup at import then closes its database connections and project_hermes.warmup.post_fork opens them per worker
+    WARMUP_PRELOADED = False
+
+    # Resumable photo uploads, in bytes
+    MAX_PHOTO_UPLOAD_SIZE = 20 * 1024 * 1024
+    MAX_PHOTO_CHUNK_SIZE = 4 * 1024 * 1024
+    # Seconds after which an unfinished upload is refused and deleted by expire_photo_uploads
+    PHOTO_UPLOAD_TTL = 24 * 3600
+
+    # In-process quadtree used by search_bounding_box, refreshed from Item.modified
+    SPATIAL_INDEX_ENABLED = False
+    SPATIAL_INDEX_REFRESH_INTERVAL = 5
+
+    # Activity feeds keep their newest ACTIVITY_FEED_RETENTION entries, trimmed every ACTIVITY_FEED_TRIM_INTERVAL
+    # writes on average
+    ACTIVITY_FEED_RETENTION = 500
+    ACTIVITY_FEED_TRIM_INTERVAL = 20
+    ACTIVITY_FEED_PAGE_SIZE = 50
+
+    # Batch retrieval, ids per request and seconds the serialized objects are cached
+    BATCH_MAX_IDS = 100
+    BATCH_CACHE_TIMEOUT = 60
+
+    # Offline region packs, tile side in degrees, tiles per request, thumbnail side in pixels and seconds before the
+    # version of a tile is checked again
+    REGION_PACK_TILE_SIZE = 0.5
+    REGION_PACK_MAX_TILES = 16
+    REGION_PACK_THUMBNAIL_SIZE = 256
+    REGION_PACK_CACHE_TIMEOUT = 900
+
+    # Streamed JSON responses (`?stream=1`), rows serialized per batch and gzip level when the client accepts it
+    STREAM_BATCH_SIZE = 500
+    STREAM_COMPRESSION_LEVEL = 6
+
+    # Heatmap grids are at most MAX_HEATMAP_CELLS cells on a side and cached for HEATMAP_CACHE_TIMEOUT seconds
+    MAX_HEATMAP_CELLS = 256
+    HEATMAP_CACHE_TIMEOUT = 300
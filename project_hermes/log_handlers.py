@@ -0,0 +1,112 @@
+"""
+Logging handlers which never block the request thread on the disk
+"""
+
+import logging
+import logging.handlers
+import os
+import queue
+import threading
+
+
+class QueueFileHandler(logging.handlers.QueueHandler):
+    """
+    Puts the formatted records on a bounded queue, a listener thread writes them in batches to the file.
+    When the queue is full the record is dropped and counted instead of waiting for the disk.
+
+    Every worker process appends to the same file, which is only safe with O_APPEND writes, so the file is not
+    rotated here: rotate it with logrotate, the WatchedFileHandler underneath reopens it after the rename.
+    The listener is started by the first record of each process, so workers forked from a preloading master get
+    their own queue and thread.
+    """
+
+    def __init__(self, filename, queue_size=10000, batch_size=200, flush_interval=1.0):
+        super().__init__(queue.Queue(queue_size))
+        self.target = logging.handlers.WatchedFileHandler(filename)
+        # Records are already formatted by prepare() on the request thread
+        self.target.setFormatter(logging.Formatter('%(message)s'))
+        self.queue_size = queue_size
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.dropped = 0
+        self.listener = None
+        self.listener_pid = None
+        self.listener_lock = threading.Lock()
+
+    def start_listener(self):
+        with self.listener_lock:
+            if self.listener_pid == os.getpid():
+                return
+            if self.listener_pid is not None:
+                # Forked, the queue of the parent may hold its records and its locks
+                self.queue = queue.Queue(self.queue_size)
+            self.listener = threading.Thread(target=self.listen, name='log-writer-%s' % self.target.baseFilename,
+                                             daemon=True)
+            self.listener.start()
+            self.listener_pid = os.getpid()
+
+    def enqueue(self, record):
+        if self.listener_pid != os.getpid():
+            self.start_listener()
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+            from project_hermes.metrics import registry
+            registry.inc('hermes_log_records_dropped_total', [('file', self.target.baseFilename)])
+
+    def listen(self):
+        while True:
+            try:
+                record = self.queue.get(timeout=self.flush_interval)
+            except queue.Empty:
+                continue
+
+            records = [record]
+            while record is not None and len(records) < self.batch_size:
+                try:
+                    record = self.queue.get_nowait()
+                except queue.Empty:
+                    break
+                records.append(record)
+
+            self.write([record for record in records if record is not None])
+            if records[-1] is None:
+                return
+
+    def write(self, records):
+        target = self.target
+        try:
+            self.reopen_if_moved()
+            for record in records:
+                target.stream.write(target.format(record) + target.terminator)
+            target.flush()
+        except Exception:  # pylint: disable=W0703
+            target.handleError(records[-1] if records else None)
+
+    def reopen_if_moved(self):
+        """
+        Reopens the file when logrotate moved it away, what WatchedFileHandler.emit does for single records
+        """
+
+        target = self.target
+        try:
+            stat = os.stat(target.baseFilename)
+        except FileNotFoundError:
+            stat = None
+        if stat is None or (stat.st_dev, stat.st_ino) != (target.dev, target.ino):
+            if target.stream:
+                target.stream.flush()
+                target.stream.close()
+            target.stream = target._open()
+            target._statstream()
+
+    def close(self):
+        if self.listener_pid == os.getpid() and self.listener.is_alive():
+            try:
+                self.queue.put(None, timeout=self.flush_interval)
+            except queue.Full:
+                pass
+            self.listener.join(self.flush_interval * 5)
+        self.target.close()
+        super().close()
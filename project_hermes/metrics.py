@@ -0,0 +1,318 @@
+"""
+In-process metrics exposed in the Prometheus text format.
+
+Every worker process keeps its counters and histograms in memory and a background thread snapshots them to its own
+file under logs/metrics every Configurations.METRICS_FLUSH_INTERVAL seconds, off the request threads. A scrape of any worker merges the
+snapshots of all the workers, so the numbers cover the whole deployment without an external collector.
+Gauges are per-process values computed at scrape time and carry a `pid` label.
+"""
+
+import functools
+import json
+import os
+import threading
+import time
+
+from django.conf import settings
+from django.db import connections
+from django.db.backends.signals import connection_created
+from django.db.backends.utils import CursorWrapper, CursorDebugWrapper
+from django.http import HttpResponse, HttpResponseForbidden
+
+from project_hermes.hermes_config import Configurations
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+class Registry:
+    def __init__(self):
+        self.gauges = {}
+        self.reset()
+
+    def reset(self):
+        self.pid = os.getpid()
+        self.lock = threading.Lock()
+        self.counters = {}
+        self.histograms = {}
+        self.flusher = None
+        self.file_name = '%d-%d.json' % (self.pid, time.time())
+
+    def check_fork(self):
+        # A worker forked from a preloading master starts its own snapshot instead of continuing the master's, the
+        # flusher thread of the master did not survive the fork either
+        if os.getpid() != self.pid:
+            self.reset()
+        if self.flusher is None:
+            self.start_flusher()
+
+    def start_flusher(self):
+        with self.lock:
+            if self.flusher is not None:
+                return
+            self.flusher = threading.Thread(target=self.run_flusher, name='metrics-flusher', daemon=True)
+            self.flusher.start()
+
+    def run_flusher(self):
+        flusher = self.flusher
+        while self.flusher is flusher:
+            time.sleep(Configurations.METRICS_FLUSH_INTERVAL)
+            try:
+                self.flush()
+            except OSError:
+                pass
+
+    def inc(self, name, labels=(), value=1.0):
+        self.check_fork()
+        key = (name, tuple(sorted(labels)))
+        with self.lock:
+            self.counters[key] = self.counters.get(key, 0.0) + value
+
+    def observe(self, name, value, labels=(), buckets=DEFAULT_BUCKETS):
+        self.check_fork()
+        key = (name, tuple(sorted(labels)))
+        with self.lock:
+            histogram = self.histograms.get(key)
+            if histogram is None:
+                histogram = self.histograms[key] = {'buckets': list(buckets), 'counts': [0] * len(buckets),
+                                                    'sum': 0.0, 'count': 0}
+            for index, bound in enumerate(histogram['buckets']):
+                if value <= bound:
+                    histogram['counts'][index] += 1
+                    break
+            histogram['sum'] += value
+            histogram['count'] += 1
+
+    def register_gauge(self, name, function):
+        self.gauges[name] = function
+
+    def snapshot(self):
+        with self.lock:
+            return {
+                'counters': [[name, labels, value] for (name, labels), value in self.counters.items()],
+                'histograms': [[name, labels, histogram] for (name, labels), histogram in self.histograms.items()],
+            }
+
+    def flush(self):
+        self.check_fork()
+        directory = get_directory()
+        os.makedirs(directory, exist_ok=True)
+        path = os.path.join(directory, self.file_name)
+        with open(path + '.tmp', 'w') as snapshot_file:
+            json.dump(self.snapshot(), snapshot_file)
+        os.replace(path + '.tmp', path)
+
+
+registry = Registry()
+
+
+def get_directory():
+    return os.path.join(settings.BASE_DIR, 'logs', 'metrics')
+
+
+def is_dead_snapshot(path, file_name):
+    """
+    Snapshot of a worker which exited, not written for METRICS_SNAPSHOT_MAX_AGE seconds and whose pid is gone
+    """
+
+    try:
+        if time.time() - os.path.getmtime(path) < Configurations.METRICS_SNAPSHOT_MAX_AGE:
+            return False
+        os.kill(int(file_name.split('-', 1)[0]), 0)
+    except ProcessLookupError:
+        return True
+    except (OSError, ValueError):
+        return False
+    return False
+
+
+class QueryCountingMixin:
+    """
+    Cursor wrapper counting the statements run on its connection, without keeping their SQL like the debug cursor
+    """
+
+    def execute(self, sql, params=None):
+        self.db.metrics_query_count = getattr(self.db, 'metrics_query_count', 0) + 1
+        return super().execute(sql, params)
+
+    def executemany(self, sql, param_list):
+        self.db.metrics_query_count = getattr(self.db, 'metrics_query_count', 0) + 1
+        return super().executemany(sql, param_list)
+
+
+class QueryCountingCursorWrapper(QueryCountingMixin, CursorWrapper):
+    pass
+
+
+class QueryCountingDebugCursorWrapper(QueryCountingMixin, CursorDebugWrapper):
+    pass
+
+
+def install_query_counter(sender, connection, **kwargs):
+    connection.make_cursor = lambda cursor: QueryCountingCursorWrapper(cursor, connection)
+    connection.make_debug_cursor = lambda cursor: QueryCountingDebugCursorWrapper(cursor, connection)
+
+
+def get_query_count():
+    return sum(getattr(database, 'metrics_query_count', 0) for database in connections.all())
+
+
+def timed(task):
+    """
+    Decorator counting the invocations and the duration of a piece of derived work
+    """
+
+    def decorator(function):
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            start = time.monotonic()
+            try:
+                return function(*args, **kwargs)
+            finally:
+                registry.inc('hermes_derived_work_total', [('task', task)])
+                registry.observe('hermes_derived_work_duration_seconds', time.monotonic() - start, [('task', task)])
+        return wrapper
+    return decorator
+
+
+def record_cache(cache_name, hit):
+    registry.inc('hermes_cache_requests_total', [('cache', cache_name), ('result', 'hit' if hit else 'miss')])
+
+
+def format_labels(labels, extra=()):
+    labels = list(labels) + list(extra)
+    if not labels:
+        return ''
+    return '{%s}' % ','.join('%s="%s"' % (key, str(value).replace('\\', '\\\\').replace('"', '\\"'))
+                             for key, value in labels)
+
+
+def collect():
+    """
+    Merges the snapshots of every worker, the current process contributes its live values
+    """
+
+    registry.flush()
+
+    counters = {}
+    histograms = {}
+    directory = get_directory()
+    for file_name in os.listdir(directory):
+        if not file_name.endswith('.json'):
+            continue
+        path = os.path.join(directory, file_name)
+        if is_dead_snapshot(path, file_name):
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+            continue
+        try:
+            with open(path) as snapshot_file:
+                snapshot = json.load(snapshot_file)
+        except (OSError, ValueError):
+            continue
+
+        for name, labels, value in snapshot['counters']:
+            key = (name, tuple(tuple(label) for label in labels))
+            counters[key] = counters.get(key, 0.0) + value
+        for name, labels, histogram in snapshot['histograms']:
+            key = (name, tuple(tuple(label) for label in labels))
+            merged = histograms.setdefault(key, {'buckets': histogram['buckets'],
+                                                 'counts': [0] * len(histogram['buckets']), 'sum': 0.0, 'count': 0})
+            merged['counts'] = [total + count for total, count in zip(merged['counts'], histogram['counts'])]
+            merged['sum'] += histogram['sum']
+            merged['count'] += histogram['count']
+    return counters, histograms
+
+
+def render():
+    counters, histograms = collect()
+    lines = []
+
+    typed = set()
+    for (name, labels), value in sorted(counters.items()):
+        if name not in typed:
+            lines.append('# TYPE %s counter' % name)
+            typed.add(name)
+        lines.append('%s%s %s' % (name, format_labels(labels), repr(float(value))))
+
+    for (name, labels), histogram in sorted(histograms.items()):
+        if name not in typed:
+            lines.append('# TYPE %s histogram' % name)
+            typed.add(name)
+        cumulative = 0
+        for bound, count in zip(histogram['buckets'], histogram['counts']):
+            cumulative += count
+            lines.append('%s_bucket%s %d' % (name, format_labels(labels, [('le', repr(float(bound)))]), cumulative))
+        lines.append('%s_bucket%s %d' % (name, format_labels(labels, [('le', '+Inf')]), histogram['count']))
+        lines.append('%s_sum%s %s' % (name, format_labels(labels), repr(float(histogram['sum']))))
+        lines.append('%s_count%s %d' % (name, format_labels(labels), histogram['count']))
+
+    pid = [('pid', os.getpid())]
+    for name, function in sorted(registry.gauges.items()):
+        value = function()
+        if value is None:
+            continue
+        lines.append('# TYPE %s gauge' % name)
+        lines.append('%s%s %s' % (name, format_labels(pid), repr(float(value))))
+
+    return '\n'.join(lines) + '\n'
+
+
+def metrics_view(request):
+    if request.META.get('REMOTE_ADDR') not in Configurations.METRICS_ALLOWED_IPS and not request.user.is_staff:
+        return HttpResponseForbidden()
+    return HttpResponse(render(), content_type='text/plain; version=0.0.4; charset=utf-8')
+
+
+class MetricsMiddleware:
+    """
+    Counts the requests, their latency and their database queries per route, streamed responses included up to their
+    last chunk. Should be the first middleware.
+    """
+
+    def __init__(self):
+        if Configurations.METRICS_COUNT_QUERIES:
+            connection_created.connect(install_query_counter, dispatch_uid='metrics_query_counter')
+            for database in connections.all():
+                if database.connection is not None:
+                    install_query_counter(None, database)
+
+    def process_request(self, request):
+        request.metrics_start = time.monotonic()
+        if Configurations.METRICS_COUNT_QUERIES:
+            request.metrics_queries = get_query_count()
+
+    def process_response(self, request, response):
+        if getattr(request, 'metrics_start', None) is None:
+            return response
+
+        if response.streaming:
+            # The body is produced while the server sends it, after the view returned
+            response.streaming_content = self.measure_stream(request, response, response.streaming_content)
+        else:
+            self.record(request, response)
+        return response
+
+    def measure_stream(self, request, response, content):
+        """
+        Passes the streamed body through and records the request once it is sent or the client went away
+        """
+
+        try:
+            yield from content
+        finally:
+            self.record(request, response)
+
+    @staticmethod
+    def record(request, response):
+        resolver_match = getattr(request, 'resolver_match', None)
+        route = resolver_match.url_name if resolver_match and resolver_match.url_name else 'unresolved'
+        registry.inc('hermes_http_requests_total',
+                     [('route', route), ('method', request.method), ('status', response.status_code)])
+        registry.observe('hermes_http_request_duration_seconds', time.monotonic() - request.metrics_start,
+                         [('route', route)])
+
+        if hasattr(request, 'metrics_queries'):
+            queries = max(0, get_query_count() - request.metrics_queries)
+            registry.inc('hermes_db_queries_total', [('route', route)], queries)
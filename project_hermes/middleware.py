@@ -0,0 +1,79 @@
+import cProfile
+import os
+import random
+import re
+import time
+
+from django.conf import settings
+from rest_framework.authentication import SessionAuthentication
+from rest_framework.exceptions import APIException
+from rest_framework.request import Request
+from rest_framework.settings import api_settings
+
+from project_hermes.hermes_config import Configurations
+
+PROFILE_HEADER = 'HTTP_X_HERMES_PROFILE'
+
+
+class ProfilingMiddleware:
+    """
+    Profiles the view, its exception handling and the rendering of its response under cProfile when staff ask for
+    it through the `X-Hermes-Profile` header or the `profile` query parameter, or for a random
+    Configurations.PROFILE_SAMPLE_RATE fraction of the requests.
+    The pstats dump is written to logs/profiles, named after the route. Must be the last middleware, so the
+    process_view of the others still runs before the profiler starts.
+    """
+
+    @staticmethod
+    def get_user(request):
+        """
+        The user of the request as the API sees it. Django only knows the session user, the other authentication
+        classes of DRF are tried here, session authentication excepted since it would enforce CSRF.
+        """
+
+        user = getattr(request, 'user', None)
+        if user is not None and user.is_authenticated():
+            return user
+
+        authenticators = [authenticator() for authenticator in api_settings.DEFAULT_AUTHENTICATION_CLASSES
+                          if not issubclass(authenticator, SessionAuthentication)]
+        try:
+            return Request(request, authenticators=authenticators).user
+        except APIException:
+            return None
+
+    def should_profile(self, request):
+        if Configurations.PROFILE_SAMPLE_RATE and random.random() < Configurations.PROFILE_SAMPLE_RATE:
+            return True
+        if PROFILE_HEADER in request.META or 'profile' in request.GET:
+            user = self.get_user(request)
+            return user is not None and user.is_staff
+        return False
+
+    @staticmethod
+    def get_route_name(request, view_func):
+        resolver_match = getattr(request, 'resolver_match', None)
+        route = resolver_match.url_name if resolver_match and resolver_match.url_name else view_func.__name__
+        return re.sub(r'[^\w.-]', '_', route)
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        if self.should_profile(request):
+            request.profiler = cProfile.Profile()
+            request.profiled_route = self.get_route_name(request, view_func)
+            request.profiler.enable()
+        return None
+
+    def process_response(self, request, response):
+        profiler = getattr(request, 'profiler', None)
+        if profiler is None:
+            return response
+        profiler.disable()
+        del request.profiler
+
+        directory = os.path.join(settings.BASE_DIR, 'logs', 'profiles')
+        os.makedirs(directory, exist_ok=True)
+        file_name = '%s-%d-%d.prof' % (request.profiled_route, time.time() * 1000, os.getpid())
+        profiler.dump_stats(os.path.join(directory, file_name))
+
+        response['X-Hermes-Profile'] = file_name
+        return response
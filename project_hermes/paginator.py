@@ -0,0 +1,24 @@
+from django.core.paginator import Paginator
+from django.db import connections
+from django.utils.functional import cached_property
+
+from project_hermes.hermes_config import Configurations
+
+
+class ApproximateCountPaginator(Paginator):
+    """
+    Paginator for the admin changelists of the large tables. An unfiltered changelist takes the row count from the
+    PostgreSQL planner statistics instead of a COUNT(*) over the whole table, filtered ones still count exactly.
+    """
+
+    @cached_property
+    def count(self):
+        queryset = self.object_list
+        connection = connections[queryset.db]
+        if not queryset.query.where and connection.vendor == 'postgresql':
+            with connection.cursor() as cursor:
+                cursor.execute('SELECT reltuples FROM pg_class WHERE relname = %s', [queryset.model._meta.db_table])
+                row = cursor.fetchone()
+            if row and row[0] >= Configurations.ADMIN_APPROXIMATE_COUNT_THRESHOLD:
+                return int(row[0])
+        return super().count
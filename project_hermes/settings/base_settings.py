@@ -35,6 +35,7 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE_CLASSES = [
+    'project_hermes.metrics.MetricsMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -43,6 +44,7 @@ MIDDLEWARE_CLASSES = [
     'django.contrib.auth.middleware.SessionAuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
+    'project_hermes.middleware.ProfilingMiddleware',
 ]
 
 ROOT_URLCONF = 'project_hermes.urls'
@@ -98,6 +100,14 @@ USE_L10N = True
 
 USE_TZ = True
 
+# Read replicas, aliases of DATABASES used by ReplicaRouter for the read-only API actions
+DATABASE_REPLICAS = []
+
+DATABASE_ROUTERS = ['project_hermes.db_router.ReplicaRouter']
+
+# Hosts of the read replicas, overridden in conf.py
+DB_REPLICA_HOST_NAMES = []
+
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
 
 STATIC_ROOT = os.path.join(BASE_DIR, 'staticfiles')
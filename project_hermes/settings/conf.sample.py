@@ -16,6 +16,10 @@ DB_HOST_NAME = 'localhost'
 
 DB_PORT = '5432'
 
+DB_REPLICA_HOST_NAMES = [
+    # 'replica.example.com',
+]
+
 ADMINS_EMAIL_LIST = [
     # ('Name', 'email@example.com'),
 ]
@@ -0,0 +1,22 @@
+"""
+DJANGO_SETTINGS_MODULE for local development of the read replica routing, two SQLite databases stand in for
+the primary and the replica
+"""
+
+from .local import *  # pylint: disable=W0614,W0401
+
+DATABASES = {
+    'default': {
+        'ENGINE': 'django.db.backends.sqlite3',
+        'NAME': os.path.join(BASE_DIR, 'primary.sqlite3'),
+    },
+    'replica': {
+        'ENGINE': 'django.db.backends.sqlite3',
+        'NAME': os.path.join(BASE_DIR, 'replica.sqlite3'),
+        'TEST': {
+            'MIRROR': 'default',
+        },
+    },
+}
+
+DATABASE_REPLICAS = ['replica']
@@ -28,6 +28,11 @@ DATABASES = {
     }
 }
 
+for index, host_name in enumerate(DB_REPLICA_HOST_NAMES):
+    alias = 'replica_%d' % index
+    DATABASES[alias] = dict(DATABASES['default'], HOST=host_name, TEST={'MIRROR': 'default'})
+    DATABASE_REPLICAS.append(alias)
+
 CACHES = {
     'default': {
         'BACKEND': 'django.core.cache.backends.memcached.MemcachedCache',
@@ -63,13 +68,13 @@ LOGGING = {
         },
         'file_django': {
             'level': 'DEBUG',
-            'class': 'logging.FileHandler',
+            'class': 'project_hermes.log_handlers.QueueFileHandler',
             'filename': os.path.join(BASE_DIR, 'logs/django.log'),
             'formatter': 'verbose'
         },
         'file_application': {
             'level': 'DEBUG',
-            'class': 'logging.FileHandler',
+            'class': 'project_hermes.log_handlers.QueueFileHandler',
             'filename': os.path.join(BASE_DIR, 'logs/application.log'),
             'formatter': 'verbose',
         },
@@ -13,30 +13,52 @@ Including another URLconf
     1. Import the include() function: from django.conf.urls import url, include
     2. Add a URL to urlpatterns:  url(r'^blog/', include('blog.urls'))
 """
+import os
 import re
 
-import rest_framework_swagger
-import rest_framework_swagger.urls
 from django.conf import settings
 from django.conf.urls import url, include
 from django.contrib import admin
+from django.core.urlresolvers import RegexURLResolver
 from django.views.static import serve
 from rest_framework.routers import DefaultRouter
 
-,from item.views import ItemViewSet, CommentViewSet, PhotoViewSet
+from account.views import LeaderboardViewSet
+from item.region_packs import serve_region_pack, PACK_DIRECTORY
+from item.storage import serve_content_addressed, CONTENT_ADDRESSED_DIRECTORY
+from item.views import ItemViewSet, CommentViewSet, PhotoViewSet, ModerationViewSet, PhotoUploadViewSet, \
+    ActivityFeedViewSet
+from project_hermes.hermes_config import Configurations
+from project_hermes.metrics import metrics_view
 
 router = DefaultRouter()
 router.register('item', ItemViewSet, base_name='item')
 router.register('comment', CommentViewSet, base_name='post')
 router.register('photo', PhotoViewSet, base_name='picture')
+router.register('moderation', ModerationViewSet, base_name='moderation')
+router.register('leaderboard', LeaderboardViewSet, base_name='leaderboard')
+router.register('photo-upload', PhotoUploadViewSet, base_name='photo-upload')
+router.register('feed', ActivityFeedViewSet, base_name='feed')
 
 urlpatterns = [
     url(r'^admin/', admin.site.urls),
     url(r'^api/', include(router.urls)),
-    url(r'^api-docs/', include(rest_framework_swagger.urls, namespace='api-docs')),
+    url(r'^metrics$', metrics_view, name='metrics'),
 ]
 
+if settings.DEBUG or Configurations.API_DOCS_ENABLED:
+    # Given by name, the swagger urls (and views) are only imported when the first /api-docs/ request is resolved
+    urlpatterns.append(RegexURLResolver(r'^api-docs/', 'rest_framework_swagger.urls', namespace='api-docs'))
+
 urlpatterns += [
+    url(r'^%s%s/(?P<name>[^/]+)$' % (re.escape(settings.MEDIA_URL.lstrip('/')), PACK_DIRECTORY), serve_region_pack,
+        name='region-pack'),
+    url(r'^%s%s/(?P<path>.*)$' % (re.escape(settings.MEDIA_URL.lstrip('/')), CONTENT_ADDRESSED_DIRECTORY),
+        serve_content_addressed,
+        kwargs={
+            'document_root': os.path.join(settings.MEDIA_ROOT, CONTENT_ADDRESSED_DIRECTORY),
+        }
+        ),
     url(r'^%s(?P<path>.*)$' % re.escape(settings.STATIC_URL.lstrip('/')), serve,
         kwargs={
             'document_root': settings.STATIC_ROOT,
@@ -0,0 +1,56 @@
+"""
+Warmup of a freshly started worker, so the first real request does not pay for the lazy initialisations
+"""
+
+import logging
+import time
+
+from django.core.cache import cache
+from django.core.urlresolvers import get_resolver, resolve, Resolver404
+from django.db import connections
+
+from item.spatial_index import get_spatial_index
+
+logger = logging.getLogger(__name__)
+
+WARMUP_PATHS = ['/api/', '/api/item/', '/api/item/1/', '/api/comment/1/', '/api/photo/1/']
+
+
+def warmup(close_connections=False):
+    """
+    Runs the lazy initialisations. With close_connections the database connections are closed at the end, for
+    processes which may still be forked and must not share them with their children.
+    """
+
+    start = time.monotonic()
+
+    # Imports every view and compiles the URL patterns
+    get_resolver()._populate()  # pylint: disable=W0212
+    for path in WARMUP_PATHS:
+        try:
+            resolve(path)
+        except Resolver404:
+            pass
+
+    if not close_connections:
+        for alias in connections:
+            connections[alias].ensure_connection()
+
+    cache.get('warmup')
+    get_spatial_index()
+
+    if close_connections:
+        # The spatial index was loaded through the default connection
+        for connection in connections.all():
+            connection.close()
+
+    logger.info('Worker warmed up in %.3fs', time.monotonic() - start)
+
+
+def post_fork(server, worker):
+    """
+    gunicorn hook, for servers preloading the application the warmup has to run in each worker after the fork
+    so the database connections are not shared between processes
+    """
+
+    warmup()
@@ -14,3 +14,12 @@ from django.core.wsgi import get_wsgi_application
 os.environ.setdefault("DJANGO_SETTINGS_MODULE", "project_hermes.settings")
 
 application = get_wsgi_application()
+
+# Resolve the URLs, open the connections and load the spatial index before the first request hits the worker. A
+# preloaded application is forked afterwards, its connections are closed again and post_fork opens them per worker.
+from project_hermes.hermes_config import Configurations  # noqa: E402 pylint: disable=C0413
+
+if Configurations.WARMUP_ON_START:
+    from project_hermes.warmup import warmup  # pylint: disable=C0413
+
+    warmup(close_connections=Configurations.WARMUP_PRELOADED)